@@ -0,0 +1,38 @@
+# app/article_cache.py
+
+import hashlib
+import json
+
+from .cache import TTLCache
+from .config import ARTICLE_CACHE_SIZE, ARTICLE_CACHE_TTL
+
+# Готовые ответы /api/newsPage/{id} вместе с ETag. Сбрасываются при голосовании,
+# публикации, удалении и загрузке изображений; TTL — страховка для других воркеров
+_articles = TTLCache(maxsize=ARTICLE_CACHE_SIZE, ttl=ARTICLE_CACHE_TTL)
+
+
+def make_etag(body) -> str:
+    # Строгий ETag от содержимого ответа: меняется вместе с текстом, тегами и рейтингом
+    raw = json.dumps(body, ensure_ascii=False, sort_keys=True, default=str)
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def get_cached_article(article_id):
+    return _articles.get(article_id)
+
+
+def cache_article(article_id, body):
+    etag = make_etag(body)
+    _articles.set(article_id, (etag, body))
+    return etag
+
+
+def invalidate_article(article_id):
+    _articles.pop(article_id)
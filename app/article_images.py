@@ -1,38 +1,43 @@
 # app/article_images.py
-from fastapi import APIRouter, UploadFile, File, Form
+from fastapi import APIRouter, UploadFile, File, Form, Depends
 from fastapi.responses import JSONResponse
 import shutil
 import os
-from app.db import get_db_connection
+from app.db import get_async_db
+from app.article_cache import invalidate_article
+from app.news import invalidate_news_feeds
+from app.image_variants import schedule_variants
 
 router = APIRouter()
 
-UPLOAD_DIR = "static/images/articles"
+# Каталог под /static (см. mount в app/main.py); изображения статьи — в подкаталоге её id,
+# как в /api/news/create: их удаляет /api/news/delete, а variant_url находит производные
+UPLOAD_DIR = "app/static/images/articles"
 
 @router.post("/api/upload_image")
-async def upload_article_image(article_id: int = Form(...), file: UploadFile = File(...)):
+async def upload_article_image(article_id: int = Form(...), file: UploadFile = File(...), conn=Depends(get_async_db)):
     try:
         # Убедись, что папка существует
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        folder = os.path.join(UPLOAD_DIR, str(article_id))
+        os.makedirs(folder, exist_ok=True)
 
-        relative_path = f"/static/images/articles/{file.filename}"
-        file_path = os.path.join("static/images/articles", file.filename)
+        filename = os.path.basename(file.filename)
+        relative_path = f"/static/images/articles/{article_id}/{filename}"
+        file_path = os.path.join(folder, filename)
 
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
+        schedule_variants([file_path])
 
         # Сохраняем путь в базу
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO article_images (article_id, image_path) VALUES (%s, %s)",
-            (article_id, relative_path)
+        await conn.execute(
+            "INSERT INTO article_images (article_id, image_path) VALUES ($1, $2)",
+            article_id, relative_path
         )
+        # Новое изображение может стать обложкой уже опубликованной статьи
+        invalidate_article(article_id)
+        invalidate_news_feeds()
 
-        conn.commit()
-        cursor.close()
-        conn.close()
-
-        return JSONResponse({"status": "ok", "path": file_path})
+        return JSONResponse({"status": "ok", "path": relative_path})
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -0,0 +1,62 @@
+# app/article_votes.py
+
+import threading
+
+from .article_cache import invalidate_article
+from .db import get_db_connection
+
+
+class VoteCounter:
+    # Отложенная запись рейтинга: голоса фиксируются в article_votes сразу, а рейтинг статьи
+    # пересчитывается периодическим сбросом, чтобы популярная статья не упиралась в блокировку строки.
+    # В памяти — только id статей с новыми голосами: рейтинг берётся из COUNT(*) по article_votes,
+    # поэтому после падения процесса он догонит голоса при следующем сбросе этой статьи
+    def __init__(self):
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def add(self, article_id):
+        with self._lock:
+            self._pending.add(article_id)
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        if not pending:
+            return 0
+
+        article_ids = sorted(pending)
+        try:
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                # Блокировки берём явно и по возрастанию id: порядок строк в UPDATE ... FROM
+                # задаёт план соединения, и параллельные сбросы воркеров могли бы взаимно заблокироваться
+                cursor.execute(
+                    "SELECT id FROM articles WHERE id = ANY(%s) ORDER BY id FOR UPDATE",
+                    (article_ids,)
+                )
+                cursor.execute("""
+                    UPDATE articles a
+                    SET rating = v.votes
+                    FROM (
+                        SELECT ids.id, COUNT(av.article_id) AS votes
+                        FROM unnest(%s::int[]) AS ids(id)
+                        LEFT JOIN article_votes av ON av.article_id = ids.id
+                        GROUP BY ids.id
+                    ) v
+                    WHERE a.id = v.id AND a.rating IS DISTINCT FROM v.votes
+                """, (article_ids,))
+                conn.commit()
+                cursor.close()
+        except Exception:
+            # Не теряем статьи: вернём их в очередь до следующего сброса
+            with self._lock:
+                self._pending.update(pending)
+            raise
+
+        for article_id in article_ids:
+            invalidate_article(article_id)
+        return len(article_ids)
+
+
+vote_counter = VoteCounter()
@@ -3,51 +3,52 @@ from fastapi.responses import JSONResponse
 from typing import List
 import shutil
 import os
-from .db import get_db_connection
+from .db import get_async_db
+from .image_variants import schedule_variants
 
 router = APIRouter()
 
-UPLOAD_DIR = "static/uploads"
+# Каталог под /static (см. mount в app/main.py), как у статей из /api/news/create
+UPLOAD_DIR = "app/static/images/articles"
 
 @router.post("/api/articles")
 async def create_article(
     title: str = Form(...),
     content: str = Form(...),
     author_id: int = Form(...),
-    files: List[UploadFile] = File(default=[])
+    files: List[UploadFile] = File(default=[]),
+    conn=Depends(get_async_db)
 ):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # 7. Вставка статьи
-        cursor.execute("""
-            INSERT INTO articles (title, content, author_id)
-            VALUES (%s, %s, %s) RETURNING id
-        """, (title, content, author_id))
-        article_id = cursor.fetchone()[0]
-
-        # 8. Сохранение изображений
-        image_paths = []
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-        for file in files:
-            filename = f"{article_id}_{file.filename}"
-            file_path = os.path.join(UPLOAD_DIR, filename)
-
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+        async with conn.transaction():
+            # 7. Вставка статьи
+            article_id = await conn.fetchval("""
+                INSERT INTO articles (title, content, author_id)
+                VALUES ($1, $2, $3) RETURNING id
+            """, title, content, author_id)
+
+            # 8. Сохранение изображений
+            image_paths = []
+            saved_files = []
+            folder = os.path.join(UPLOAD_DIR, str(article_id))
+            os.makedirs(folder, exist_ok=True)
+
+            for file in files:
+                filename = os.path.basename(file.filename)
+                file_path = os.path.join(folder, filename)
+
+                with open(file_path, "wb") as buffer:
+                    shutil.copyfileobj(file.file, buffer)
+                image_paths.append(f"/static/images/articles/{article_id}/{filename}")
+                saved_files.append(file_path)
 
             # Сохранение в БД
-            cursor.execute("""
+            await conn.executemany("""
                 INSERT INTO article_images (article_id, image_path)
-                VALUES (%s, %s)
-            """, (article_id, file_path))
-            image_paths.append(file_path)
+                VALUES ($1, $2)
+            """, [(article_id, path) for path in image_paths])
 
-        conn.commit()
-        cursor.close()
-        conn.close()
+        schedule_variants(saved_files)
 
         return JSONResponse(content={
             "message": "Article created successfully",
@@ -1,13 +1,19 @@
 # app/auth.py
 
-from fastapi import APIRouter, HTTPException, Header, Depends, File, UploadFile, Form, status
+from fastapi import APIRouter, HTTPException, Header, Depends, File, UploadFile, Form, Query, status
 from .models import UserCreate, UserLogin
 import os, shutil, json
 from fastapi.responses import JSONResponse
-from .db import get_db_connection
+from .db import get_db, get_async_db
+from fastapi.concurrency import run_in_threadpool
 from .config import SECRET_KEY, ALGORITHM
-from jose import jwt, JWTError
-import bcrypt
+from jose import jwt
+from .tokens import decode_access_token, get_current_user
+from .permissions import require_admin, invalidate_user_role
+from .passwords import hash_password, verify_password, needs_rehash
+from .resort_catalog import resort_catalog, REFRESH_SELECTOR_STATS_SQL
+from .gallery_index import gallery_index
+from .image_variants import SIZES, remove_variants, schedule_variants, variant_url
 import datetime
 import requests
 
@@ -32,64 +38,42 @@ def create_refresh_token(user_id: int):
     return create_token({"sub": str(user_id)}, datetime.timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
 
 
-def decode_access_token(token: str):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return int(payload.get("sub"))
-    except JWTError:
-        return None
-
-
-def get_current_user(Authorization: str = Header(...)):
-    token = Authorization.split(" ")[1]
-    user_id = decode_access_token(token)
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    return int(user_id)
-
-
 @router.post("/api/register")
-async def register_user(user: UserCreate):
+async def register_user(user: UserCreate, conn=Depends(get_async_db)):
     if len(user.password) < 8:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Password must be at least 8 characters long."
         )
 
-    hashed_password = bcrypt.hashpw(user.password.encode('utf-8'), bcrypt.gensalt())
-
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
         # Проверка username
-        cursor.execute("SELECT id FROM Users WHERE username = %s", (user.username,))
-        if cursor.fetchone():
+        if await conn.fetchval("SELECT id FROM Users WHERE username = $1", user.username):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Username already exists."
             )
 
         # Проверка email
-        cursor.execute("SELECT id FROM Users WHERE email = %s", (user.email,))
-        if cursor.fetchone():
+        if await conn.fetchval("SELECT id FROM Users WHERE email = $1", user.email):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered."
             )
 
+        # Хэшируем в пуле потоков уже после проверок, чтобы не тратить CPU на заведомо неудачные запросы
+        hashed_password = await hash_password(user.password)
+
         registration_date = datetime.date.today()
-        cursor.execute(
+        user_id = await conn.fetchval(
             """
             INSERT INTO Users (username, email, password, registration_date)
-            VALUES (%s, %s, %s, %s)
+            VALUES ($1, $2, $3, $4)
             RETURNING id
             """,
-            (user.username, user.email, hashed_password.decode('utf-8'), registration_date)
+            user.username, user.email, hashed_password, registration_date
         )
-        user_id = cursor.fetchone()[0]
 
-        conn.commit()
         return {"message": "User registered successfully", "userId": user_id}
 
     except HTTPException:
@@ -99,22 +83,10 @@ async def register_user(user: UserCreate):
         print(f"Unexpected registration error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-
 @router.post("/api/login")
-async def login_user(user: UserLogin):
+async def login_user(user: UserLogin, conn=Depends(get_async_db)):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT id, password, is_active FROM Users WHERE username = %s", (user.username,))
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        result = await conn.fetchrow("SELECT id, password, is_active FROM Users WHERE username = $1", user.username)
 
         if not result:
             raise HTTPException(status_code=401, detail="Неверный логин или пароль.")
@@ -124,9 +96,14 @@ async def login_user(user: UserLogin):
         if not is_active:
             raise HTTPException(status_code=403, detail="Пользователь заблокирован.")
 
-        if not bcrypt.checkpw(user.password.encode(), stored_password.encode()):
+        if not await verify_password(user.password, stored_password):
             raise HTTPException(status_code=401, detail="Неверный логин или пароль.")
 
+        # Изменился BCRYPT_ROUNDS — прозрачно перехэшируем пароль, пока он известен в открытом виде
+        if needs_rehash(stored_password):
+            new_hash = await hash_password(user.password)
+            await conn.execute("UPDATE users SET password = $1 WHERE id = $2", new_hash, user_id)
+
         return {
             "access_token": create_access_token(user_id),
             "refresh_token": create_refresh_token(user_id),
@@ -151,8 +128,9 @@ async def refresh_token(refresh_token: str = Header(...)):
 
 
 @router.get("/api/profile")
-def get_profile(user_id=Depends(get_current_user)):
-    conn = get_db_connection()
+def get_profile(size: str = Query("original"), user_id=Depends(get_current_user), conn=Depends(get_db)):
+    if size not in SIZES:
+        raise HTTPException(status_code=400, detail="Invalid size")
     cur = conn.cursor()
 
     # Получаем данные пользователя
@@ -165,7 +143,6 @@ def get_profile(user_id=Depends(get_current_user)):
 
     if not row:
         cur.close()
-        conn.close()
         raise HTTPException(status_code=404, detail="Пользователь не найден")
 
     # Проверяем наличие ожидающей заявки блогера
@@ -186,7 +163,6 @@ def get_profile(user_id=Depends(get_current_user)):
     friends_count = cur.fetchone()[0]
 
     cur.close()
-    conn.close()
 
     return {
         "id": row[0],
@@ -195,7 +171,7 @@ def get_profile(user_id=Depends(get_current_user)):
         "registration_date": row[3],
         "description": row[4],
         "gender": row[5],
-        "photo": row[6],
+        "photo": variant_url(row[6], size),
         "is_admin": row[7],
         "is_blogger": row[8],
         "has_pending_blogger_request": has_pending,
@@ -212,23 +188,21 @@ async def update_profile(
     description: str = Form(""),
     gender: str = Form(""),
     photo: UploadFile = File(None),
-    photo_delete: bool = Form(False)
+    photo_delete: bool = Form(False),
+    conn=Depends(get_async_db)
 ):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
         photo_path = None
 
         # Если пользователь запросил удаление фото
         if photo_delete:
             # Получим текущий путь фото
-            cursor.execute("SELECT photo FROM users WHERE id = %s", (user_id,))
-            current_photo = cursor.fetchone()[0]
+            current_photo = await conn.fetchval("SELECT photo FROM users WHERE id = $1", user_id)
             if current_photo:
                 full_path = f"app/{current_photo}"
                 if os.path.exists(full_path):
                     os.remove(full_path)
+                remove_variants(current_photo)
             photo_path = None  # явно указываем, что поле должно быть пустым
 
         # Если загружено новое фото
@@ -240,26 +214,23 @@ async def update_profile(
 
             with open(file_path, "wb") as f:
                 f.write(await photo.read())
+            schedule_variants([file_path])
 
             photo_path = f"/static/images/user_photo/{user_id}/{filename}"
 
         # Обновляем пользователя
         if photo_path is not None or photo_delete:
-            cursor.execute("""
+            await conn.execute("""
                 UPDATE users 
-                SET username = %s, email = %s, description = %s, gender = %s, photo = %s
-                WHERE id = %s
-            """, (username, email, description, gender, photo_path, user_id))
+                SET username = $1, email = $2, description = $3, gender = $4, photo = $5
+                WHERE id = $6
+            """, username, email, description, gender, photo_path, user_id)
         else:
-            cursor.execute("""
+            await conn.execute("""
                 UPDATE users 
-                SET username = %s, email = %s, description = %s, gender = %s
-                WHERE id = %s
-            """, (username, email, description, gender, user_id))
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+                SET username = $1, email = $2, description = $3, gender = $4
+                WHERE id = $5
+            """, username, email, description, gender, user_id)
 
         return {"message": "Profile updated successfully"}
 
@@ -269,23 +240,12 @@ async def update_profile(
 
 
 @router.get("/api/admin/users")
-async def get_all_users(current_id: int = Depends(get_current_user)):
+async def get_all_users(current_id: int = Depends(require_admin), conn=Depends(get_async_db)):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT is_admin FROM users WHERE id = %s", (current_id,))
-        is_admin = cursor.fetchone()
-        if not is_admin or not is_admin[0]:
-            raise HTTPException(status_code=403, detail="Access denied")
-
-        cursor.execute("""
+        users = await conn.fetch("""
             SELECT id, username, email, is_active, registration_date, description, gender, is_blogger 
             FROM users WHERE is_admin = false
         """)
-        users = cursor.fetchall()
-        cursor.close()
-        conn.close()
 
         return [
             {
@@ -303,20 +263,10 @@ async def get_all_users(current_id: int = Depends(get_current_user)):
     except Exception as e:
         raise HTTPException(status_code=500, detail="Ошибка получения списка пользователей")
 @router.post("/api/admin/users/{user_id}/block")
-async def block_user(user_id: int, current_id: int = Depends(get_current_user)):
+async def block_user(user_id: int, current_id: int = Depends(require_admin), conn=Depends(get_async_db)):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT is_admin FROM users WHERE id = %s", (current_id,))
-        is_admin = cursor.fetchone()
-        if not is_admin or not is_admin[0]:
-            raise HTTPException(status_code=403, detail="Access denied")
-
-        cursor.execute("UPDATE users SET is_active = false WHERE id = %s", (user_id,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        await conn.execute("UPDATE users SET is_active = false WHERE id = $1", user_id)
+        invalidate_user_role(user_id)
 
         return {"message": "User blocked"}
 
@@ -325,20 +275,10 @@ async def block_user(user_id: int, current_id: int = Depends(get_current_user)):
 
 
 @router.post("/api/admin/users/{user_id}/unblock")
-async def unblock_user(user_id: int, current_id: int = Depends(get_current_user)):
+async def unblock_user(user_id: int, current_id: int = Depends(require_admin), conn=Depends(get_async_db)):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT is_admin FROM users WHERE id = %s", (current_id,))
-        is_admin = cursor.fetchone()
-        if not is_admin or not is_admin[0]:
-            raise HTTPException(status_code=403, detail="Access denied")
-
-        cursor.execute("UPDATE users SET is_active = true WHERE id = %s", (user_id,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        await conn.execute("UPDATE users SET is_active = true WHERE id = $1", user_id)
+        invalidate_user_role(user_id)
 
         return {"message": "User unblocked"}
 
@@ -347,19 +287,12 @@ async def unblock_user(user_id: int, current_id: int = Depends(get_current_user)
 
 
 @router.post("/api/admin/comments/{comment_id}/approve")
-def approve_comment(comment_id: int, current_id: int = Depends(get_current_user)):
-    conn = get_db_connection()
+def approve_comment(comment_id: int, current_id: int = Depends(require_admin), conn=Depends(get_db)):
     cursor = conn.cursor()
 
-    cursor.execute("SELECT is_admin FROM users WHERE id = %s", (current_id,))
-    is_admin = cursor.fetchone()
-    if not is_admin or not is_admin[0]:
-        raise HTTPException(status_code=403, detail="Access denied")
-
     cursor.execute("UPDATE comments SET is_published = TRUE WHERE id = %s", (comment_id,))
     conn.commit()
     cursor.close()
-    conn.close()
 
     return {"message": "Комментарий одобрен"}
 
@@ -383,115 +316,117 @@ async def create_resort(
     latitude: float = Form(None),
     longitude: float = Form(None),
     images: list[UploadFile] = File(...),
-    user_id: int = Depends(get_current_user)
+    user_id: int = Depends(require_admin),
+    conn=Depends(get_async_db)
 ):
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    # Проверка админа
-    cur.execute("SELECT is_admin FROM users WHERE id = %s", (user_id,))
-    if not cur.fetchone()[0]:
-        raise HTTPException(status_code=403, detail="Not authorized")
-
-    # Добавление курорта
-    cur.execute("""
-        INSERT INTO ski_resort (name, information, trail_length, changes, max_height, num_reviews, season, country)
-        VALUES (%s, %s, %s, 0, %s, 0, %s, %s) RETURNING id
-    """, (name, information, trail_length, max_height, season, country))
-    resort_id = cur.fetchone()[0]
-
-    # Трассы
-    for t in json.loads(tracks):
-        cur.execute("""
-            INSERT INTO tracks (resort_id, trail_type, trail_length)
-            VALUES (%s, %s, %s)
-        """, (resort_id, t["trail_type"], t["trail_length"]))
-
-    # Ски-пасс
-    prices = json.loads(ski_pass)
-    cur.execute("""
-        INSERT INTO ski_pass (
-            resort_id, price_day, price_child, price_2_days, price_3_days,
-            price_4_days, price_5_days, price_6_days, price_7_days, season_pass
-        )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """, (
-        resort_id, prices["price_day"], prices["price_child"],
-        prices["price_2_days"], prices["price_3_days"], prices["price_4_days"],
-        prices["price_5_days"], prices["price_6_days"], prices["price_7_days"],
-        prices["season_pass"]
-    ))
-
-    # Изображения
-    # Изображения
-    save_dir = f"app/static/images/resorts/{resort_id}"
-    os.makedirs(save_dir, exist_ok=True)
-
-    url_path = f"/static/images/resorts/{resort_id}"
-
-    for idx, image in enumerate(images, 1):
-        ext = os.path.splitext(image.filename)[1]
-        save_path = f"{save_dir}/img{idx}{ext}"  # абсолютный путь для сохранения
-        url = f"{url_path}/img{idx}{ext}"  # относительный URL
-
-        with open(save_path, "wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
-
-        cur.execute("""
-            INSERT INTO resort_images (resort_id, image_path)
-            VALUES (%s, %s)
-        """, (resort_id, url))
-
-    # Координаты (если не указаны — получить через Яндекс)
+    # Координаты (если не указаны — получить через Яндекс).
+    # Запрос к геокодеру блокирующий, поэтому выполняем его в пуле потоков и до начала транзакции
     if latitude is None or longitude is None:
         address = f"{country}, {name}"
         geo_url = f"https://geocode-maps.yandex.ru/1.x/?apikey={YANDEX_API_KEY}&geocode={address}&format=json"
-        response = requests.get(geo_url)
+        response = await run_in_threadpool(requests.get, geo_url)
         try:
             pos = response.json()["response"]["GeoObjectCollection"]["featureMember"][0]["GeoObject"]["Point"]["pos"]
             longitude, latitude = map(float, pos.split())
         except Exception:
             latitude = longitude = None
 
-    if latitude is not None and longitude is not None:
-        cur.execute("""
-            INSERT INTO coordinates_resort (resort_id, latitude, longitude)
-            VALUES (%s, %s, %s)
-        """, (resort_id, latitude, longitude))
+    async with conn.transaction():
+        # Добавление курорта
+        resort_id = await conn.fetchval("""
+            INSERT INTO ski_resort (name, information, trail_length, changes, max_height, num_reviews, season, country)
+            VALUES ($1, $2, $3, 0, $4, 0, $5, $6) RETURNING id
+        """, name, information, trail_length, max_height, season, country)
 
-    # Начальная запись о погоде
-    cur.execute("""
-        INSERT INTO resort_weather (resort_id, snow_last_3_days, snow_expected, has_glacier, updated_at)
-        VALUES (%s,False, False, False, %s)
-    """, (resort_id, datetime.datetime.utcnow()))
+        # Трассы
+        await conn.executemany("""
+            INSERT INTO tracks (resort_id, trail_type, trail_length)
+            VALUES ($1, $2, $3)
+        """, [(resort_id, t["trail_type"], t["trail_length"]) for t in json.loads(tracks)])
+
+        # Ски-пасс
+        prices = json.loads(ski_pass)
+        await conn.execute("""
+            INSERT INTO ski_pass (
+                resort_id, price_day, price_child, price_2_days, price_3_days,
+                price_4_days, price_5_days, price_6_days, price_7_days, season_pass
+            )
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+        """,
+            resort_id, prices["price_day"], prices["price_child"],
+            prices["price_2_days"], prices["price_3_days"], prices["price_4_days"],
+            prices["price_5_days"], prices["price_6_days"], prices["price_7_days"],
+            prices["season_pass"]
+        )
 
-    cur.execute("""
-        INSERT INTO resort_extra_info (resort_id, how_to_get_there, nearby_cities, related_ski_areas)
-        VALUES (%s, %s, %s, %s)
-    """, (resort_id, how_to_get_there, nearby_cities, related_ski_areas))
+        # Изображения: в транзакции только записи, сами файлы пишутся после commit
+        save_dir = f"app/static/images/resorts/{resort_id}"
+        url_path = f"/static/images/resorts/{resort_id}"
 
-    f = json.loads(features)
-    cur.execute("""
-        INSERT INTO resort_features (
-            resort_id, panoramic_trails_above_2500m, guaranteed_snow, snowboard_friendly,
-            night_skiing, kiting_available, snowparks_count, halfpipes_count, artificial_snow,
-            forest_trails, glacier_available, summer_skiing, freeride_opportunities,
-            official_freeride_zones, backcountry_routes, heliski_available,
-            official_freeride_guides, kids_ski_schools, fis_certified_trails_count
-        ) VALUES (
-            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+        image_urls = []
+        saved_files = []
+        for idx, image in enumerate(images, 1):
+            ext = os.path.splitext(image.filename)[1]
+            save_path = f"{save_dir}/img{idx}{ext}"  # абсолютный путь для сохранения
+            url = f"{url_path}/img{idx}{ext}"  # относительный URL
+            image_urls.append((resort_id, url))
+            saved_files.append(save_path)
+
+        await conn.executemany("""
+            INSERT INTO resort_images (resort_id, image_path)
+            VALUES ($1, $2)
+        """, image_urls)
+
+        if latitude is not None and longitude is not None:
+            await conn.execute("""
+                INSERT INTO coordinates_resort (resort_id, latitude, longitude)
+                VALUES ($1, $2, $3)
+            """, resort_id, latitude, longitude)
+
+        # Начальная запись о погоде
+        await conn.execute("""
+            INSERT INTO resort_weather (resort_id, snow_last_3_days, snow_expected, has_glacier, updated_at)
+            VALUES ($1, False, False, False, $2)
+        """, resort_id, datetime.datetime.utcnow())
+
+        await conn.execute("""
+            INSERT INTO resort_extra_info (resort_id, how_to_get_there, nearby_cities, related_ski_areas)
+            VALUES ($1, $2, $3, $4)
+        """, resort_id, how_to_get_there, nearby_cities, related_ski_areas)
+
+        f = json.loads(features)
+        await conn.execute("""
+            INSERT INTO resort_features (
+                resort_id, panoramic_trails_above_2500m, guaranteed_snow, snowboard_friendly,
+                night_skiing, kiting_available, snowparks_count, halfpipes_count, artificial_snow,
+                forest_trails, glacier_available, summer_skiing, freeride_opportunities,
+                official_freeride_zones, backcountry_routes, heliski_available,
+                official_freeride_guides, kids_ski_schools, fis_certified_trails_count
+            ) VALUES (
+                $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17, $18, $19
+            )
+        """,
+            resort_id, f["panoramic_trails_above_2500m"], f["guaranteed_snow"], f["snowboard_friendly"],
+            f["night_skiing"], f["kiting_available"], f["snowparks_count"], f["halfpipes_count"],
+            f["artificial_snow"], f["forest_trails"], f["glacier_available"], f["summer_skiing"],
+            f["freeride_opportunities"], f["official_freeride_zones"], f["backcountry_routes"],
+            f["heliski_available"], f["official_freeride_guides"], f["kids_ski_schools"],
+            f["fis_certified_trails_count"]
         )
-    """, (
-        resort_id, f["panoramic_trails_above_2500m"], f["guaranteed_snow"], f["snowboard_friendly"],
-        f["night_skiing"], f["kiting_available"], f["snowparks_count"], f["halfpipes_count"],
-        f["artificial_snow"], f["forest_trails"], f["glacier_available"], f["summer_skiing"],
-        f["freeride_opportunities"], f["official_freeride_zones"], f["backcountry_routes"],
-        f["heliski_available"], f["official_freeride_guides"], f["kids_ski_schools"],
-        f["fis_certified_trails_count"]
-    ))
 
-    conn.commit()
-    cur.close()
-    conn.close()
-    return {"message": "Курорт успешно добавлен"}
+        # Новые трассы попадают в агрегаты селектора
+        await conn.execute(REFRESH_SELECTOR_STATS_SQL)
 
+    # Файлы — после commit: при откате транзакции на диске не остаётся файлов без записей
+    os.makedirs(save_dir, exist_ok=True)
+    for image, save_path in zip(images, saved_files):
+        with open(save_path, "wb") as buffer:
+            shutil.copyfileobj(image.file, buffer)
+    # Новая галерея видна сразу, не дожидаясь проверки mtime
+    gallery_index.invalidate(("images", "resorts", resort_id))
+    schedule_variants(saved_files)
+
+    # Курорт уже закоммичен — пересобираем снимок каталога, чтобы он сразу появился в выдаче
+    await run_in_threadpool(resort_catalog.rebuild)
+
+    return {"message": "Курорт успешно добавлен"}
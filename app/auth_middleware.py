@@ -1,27 +1,32 @@
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers
 from starlette.responses import JSONResponse
-from jose import jwt, JWTError
+from jose import JWTError
 import re
 
-from .config import SECRET_KEY, ALGORITHM
+from .tokens import decode_token
 
 PUBLIC_PATH_PATTERNS = [
     r"^/api/login$",
     r"^/api/register$",
     r"^/api/news$",
+    r"^/api/news/search$",
+    r"^/api/news/tags$",
     r"^/api/newsPage$",
     r"^/api/newsPage/\d+$",
     r"^/api/resorts$",
-    r"/api/blogger-reviews",
-    r"/api//blogger-reviews/[^/]/images",
+    r"^/api/resort-catalog$",
+    r"^/api/blogger-reviews$",
+    r"^/api/blogger-reviews/images$",
+    r"^/api/blogger-reviews/\d+/images$",
     r"^/api/resorts-table$",
     r"^/api/resort-features/\d+$",
     r"^/api/resorts/selector$",
+    r"^/api/resorts/selector/facets$",
     r"^/api/resorts/\d+$",
+    r"^/api/resorts/\d+/snow-forecast$",
     r"^/api/comments/\d+$",
     r"^/api/resorts/\d+/hotels$",
-    r"^/api/resorts/preview-reviews",
+    r"^/api/resorts/preview-reviews$",
     r"^/api/resorts/\d+/reviews$",
     r"^/api/resort-images/[^/]+$",
     r"^/api/hotels-images/\d+/\d+$",
@@ -30,26 +35,46 @@ PUBLIC_PATH_PATTERNS = [
     r"^/openapi.json$"
 ]
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        path = request.url.path
+# Один скомпилированный regex вместо перебора шаблонов на каждый запрос.
+# match() привязан к началу строки, как и прежний re.match по каждому шаблону
+PUBLIC_PATH_RE = re.compile("|".join(f"(?:{pattern})" for pattern in PUBLIC_PATH_PATTERNS))
 
-        # Разрешаем доступ к статике и публичным маршрутам
-        if path.startswith("/static") or any(re.match(pattern, path) for pattern in PUBLIC_PATH_PATTERNS):
-            return await call_next(request)
 
-        auth_header = request.headers.get("Authorization")
+def is_public_path(path: str) -> bool:
+    # Разрешаем доступ к статике и публичным маршрутам
+    return path.startswith("/static") or PUBLIC_PATH_RE.match(path) is not None
+
+
+class AuthMiddleware:
+    # Чистое ASGI-middleware: без BaseHTTPMiddleware, лишних задач и обёрток над потоком ответа
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or is_public_path(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        auth_header = Headers(scope=scope).get("Authorization")
         if not auth_header or not auth_header.startswith("Bearer "):
-            return JSONResponse(status_code=401, content={"detail": "Missing or invalid Authorization header"})
+            response = JSONResponse(status_code=401, content={"detail": "Missing or invalid Authorization header"})
+            await response(scope, receive, send)
+            return
 
         token = auth_header.split(" ")[1]
         try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            user_id = payload.get("sub")
-            if user_id is None:
-                return JSONResponse(status_code=401, content={"detail": "Invalid token payload"})
-            request.state.user_id = user_id
+            payload = decode_token(token)
+            if payload is None:
+                response = JSONResponse(status_code=401, content={"detail": "Invalid token payload"})
+                await response(scope, receive, send)
+                return
         except JWTError as e:
-            return JSONResponse(status_code=401, content={"detail": f"Invalid or expired token: {str(e)}"})
+            response = JSONResponse(status_code=401, content={"detail": f"Invalid or expired token: {str(e)}"})
+            await response(scope, receive, send)
+            return
 
-        return await call_next(request)
+        # request.state читает scope["state"]; зависимости берут отсюда уже проверенные claims
+        state = scope.setdefault("state", {})
+        state["user_id"] = payload["sub"]
+        state["token_claims"] = payload
+        await self.app(scope, receive, send)
@@ -1,20 +1,39 @@
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Query, Response
+from typing import List, Optional
 from pydantic import BaseModel
 from .auth import get_current_user
+from .permissions import require_admin, invalidate_user_role
 import os, shutil
 from datetime import datetime
-from .db import get_db_connection
+from .db import get_db, get_async_db
+from .pagination import encode_cursor, decode_cursor, set_next_cursor
+from .image_variants import SIZES, schedule_variants, variant_url
 
 router = APIRouter()
 
+BLOGGER_REVIEWS_PAGE_SIZE = 20
+BLOGGER_MODERATION_PAGE_SIZE = 50
+BLOGGER_REVIEWS_PAGE_MAX_SIZE = 100
+BLOGGER_IMAGES_MAX_IDS = 100
+
+# Файлы сохраняются как img1, img2, ..., img10: сортировка по длине, затем по имени
+# даёт порядок загрузки
+IMAGE_ORDER = "length(image_path), image_path"
+
+REVIEW_IMAGES_SQL = f"""
+    COALESCE((
+        SELECT array_agg(bri.image_path ORDER BY length(bri.image_path), bri.image_path)
+        FROM blogger_review_images bri
+        WHERE bri.review_id = br.id
+    ), '{{}}') AS images
+"""
+
 
 class BloggerRequestCreate(BaseModel):
     comment: str
 
 @router.post("/api/blogger-requests")
-def submit_blogger_request(data: BloggerRequestCreate, user=Depends(get_current_user)):
-    conn = get_db_connection()
+def submit_blogger_request(data: BloggerRequestCreate, user=Depends(get_current_user), conn=Depends(get_db)):
     cur = conn.cursor()
 
     # Проверка: есть ли уже заявка
@@ -28,20 +47,13 @@ def submit_blogger_request(data: BloggerRequestCreate, user=Depends(get_current_
     )
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Заявка отправлена"}
 
 @router.get("/api/blogger-requests")
-def get_blogger_requests(user_id=Depends(get_current_user)):
-    conn = get_db_connection()
+def get_blogger_requests(user_id=Depends(require_admin), conn=Depends(get_db)):
     cur = conn.cursor()
 
-    cur.execute("SELECT is_admin FROM users WHERE id = %s", (user_id,))
-    is_admin = cur.fetchone()
-    if not is_admin or not is_admin[0]:
-        raise HTTPException(status_code=403, detail="Access denied")
-
     cur.execute("""
         SELECT br.id, u.username, u.email, br.comment, br.status, br.created_at
         FROM blogger_requests br
@@ -50,7 +62,6 @@ def get_blogger_requests(user_id=Depends(get_current_user)):
     """)
     rows = cur.fetchall()
     cur.close()
-    conn.close()
 
     return [
         {
@@ -65,48 +76,79 @@ def get_blogger_requests(user_id=Depends(get_current_user)):
 
 
 @router.post("/api/blogger-requests/{request_id}/{action}")
-def handle_request(request_id: int, action: str, user_id=Depends(get_current_user)):
+def handle_request(request_id: int, action: str, user_id=Depends(require_admin), conn=Depends(get_db)):
     if action not in ["approve", "reject"]:
         raise HTTPException(status_code=400, detail="Invalid action")
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
-    cur.execute("SELECT is_admin FROM users WHERE id = %s", (user_id,))
-    is_admin = cur.fetchone()
-    if not is_admin or not is_admin[0]:
-        raise HTTPException(status_code=403, detail="Access denied")
-
     cur.execute("UPDATE blogger_requests SET status = %s WHERE id = %s", (action, request_id))
 
+    approved = None
     if action == "approve":
         cur.execute("""
             UPDATE users
             SET is_blogger = TRUE
             WHERE id = (SELECT user_id FROM blogger_requests WHERE id = %s)
+            RETURNING id
         """, (request_id,))
+        approved = cur.fetchone()
 
     conn.commit()
+    if approved:
+        # Роль пользователя изменилась — сбрасываем кэш
+        invalidate_user_role(approved[0])
     cur.close()
-    conn.close()
 
     return {"message": "Заявка обновлена"}
 
-@router.get("/api/blogger-reviews")
-def get_approved_reviews():
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT br.id, br.title, br.content, u.username, br.created_at
+def _review_page(cur, status, cursor, limit):
+    # Страница обзоров с изображениями одним запросом: keyset по (created_at, id),
+    # пути изображений собираются в массив коррелированным подзапросом по индексу review_id
+    keyset = ""
+    params = [status]
+    if cursor:
+        created_at, review_id = decode_cursor(cursor, 2)
+        try:
+            params.extend([datetime.fromisoformat(created_at), int(review_id)])
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        keyset = "AND (br.created_at, br.id) < (%s, %s)"
+    params.append(limit + 1)
+
+    cur.execute(f"""
+        SELECT br.id, br.title, br.content, u.username, br.created_at, br.status,
+               {REVIEW_IMAGES_SQL}
         FROM blogger_reviews br
         JOIN users u ON br.user_id = u.id
-        WHERE br.status = 'approved'
-        ORDER BY br.created_at DESC
-    """)
+        WHERE br.status = %s {keyset}
+        ORDER BY br.created_at DESC, br.id DESC
+        LIMIT %s
+    """, params)
     rows = cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][4], rows[-1][0])
+    return rows, next_cursor
+
+
+@router.get("/api/blogger-reviews")
+def get_approved_reviews(
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(BLOGGER_REVIEWS_PAGE_SIZE, ge=1, le=BLOGGER_REVIEWS_PAGE_MAX_SIZE),
+    size: str = Query("medium"),
+    conn=Depends(get_db)
+):
+    if size not in SIZES:
+        raise HTTPException(status_code=400, detail="Invalid size")
+
+    cur = conn.cursor()
+    rows, next_cursor = _review_page(cur, "approved", cursor, limit)
     cur.close()
-    conn.close()
+    set_next_cursor(response, next_cursor)
 
     return [
         {
@@ -114,7 +156,8 @@ def get_approved_reviews():
             "title": r[1],
             "content": r[2],
             "author": r[3],
-            "created_at": r[4]
+            "created_at": r[4],
+            "images": [variant_url(path, size) for path in r[6]]
         } for r in rows
     ]
 
@@ -123,98 +166,76 @@ async def create_blogger_review(
     title: str = Form(...),
     content: str = Form(...),  # HTML-формат
     images: List[UploadFile] = File([]),
-    user_id: int = Depends(get_current_user)
+    user_id: int = Depends(get_current_user),
+    conn=Depends(get_async_db)
 ):
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO blogger_reviews (user_id, title, content, status)
-        VALUES (%s, %s, %s, 'pending') RETURNING id
-    """, (user_id, title, content))
-
-    review_id = cur.fetchone()[0]
-
-    image_dir = f"app/static/images/blogger_reviews/{review_id}"
-    os.makedirs(image_dir, exist_ok=True)
-
-    for idx, image in enumerate(images, 1):
-        ext = os.path.splitext(image.filename)[1]
-        filename = f"img{idx}{ext}"
-        server_path = os.path.join(image_dir, filename)
-        web_path = f"/static/images/blogger_reviews/{review_id}/{filename}"
-
-        with open(server_path, "wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
-
-        cur.execute("""
+    async with conn.transaction():
+        review_id = await conn.fetchval("""
+            INSERT INTO blogger_reviews (user_id, title, content, status)
+            VALUES ($1, $2, $3, 'pending') RETURNING id
+        """, user_id, title, content)
+
+        image_dir = f"app/static/images/blogger_reviews/{review_id}"
+        os.makedirs(image_dir, exist_ok=True)
+
+        web_paths = []
+        for idx, image in enumerate(images, 1):
+            ext = os.path.splitext(image.filename)[1]
+            filename = f"img{idx}{ext}"
+            server_path = os.path.join(image_dir, filename)
+            web_path = f"/static/images/blogger_reviews/{review_id}/{filename}"
+
+            with open(server_path, "wb") as buffer:
+                shutil.copyfileobj(image.file, buffer)
+            web_paths.append((review_id, web_path))
+
+        await conn.executemany("""
             INSERT INTO blogger_review_images (review_id, image_path)
-            VALUES (%s, %s)
-        """, (review_id, web_path))
+            VALUES ($1, $2)
+        """, web_paths)
 
-    conn.commit()
-    cur.close()
-    conn.close()
+    schedule_variants([f"app{path}" for _, path in web_paths])
 
     return {"message": "Обзор успешно опубликован"}
 
 @router.get("/api/blogger-reviews/moderation")
-def get_pending_reviews(user_id=Depends(get_current_user)):
-    conn = get_db_connection()
+def get_pending_reviews(
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(BLOGGER_MODERATION_PAGE_SIZE, ge=1, le=BLOGGER_REVIEWS_PAGE_MAX_SIZE),
+    user_id=Depends(require_admin),
+    conn=Depends(get_db)
+):
     cur = conn.cursor()
+    rows, next_cursor = _review_page(cur, "pending", cursor, limit)
+    cur.close()
+    set_next_cursor(response, next_cursor)
 
-    cur.execute("SELECT is_admin FROM users WHERE id = %s", (user_id,))
-    if not cur.fetchone()[0]:
-        raise HTTPException(status_code=403, detail="Access denied")
-
-    cur.execute("""
-        SELECT br.id, br.title, br.content, u.username, br.created_at, br.status
-        FROM blogger_reviews br
-        JOIN users u ON br.user_id = u.id
-        WHERE br.status = 'pending'
-        ORDER BY br.created_at DESC
-    """)
-    reviews = cur.fetchall()
-
-    result = []
-    for r in reviews:
-        cur.execute(
-            "SELECT image_path FROM blogger_review_images WHERE review_id = %s",
-            (r[0],)
-        )
-        images = [img[0] for img in cur.fetchall()]
-        result.append({
+    return [
+        {
             "id": r[0],
             "title": r[1],
             "content": r[2],
             "author": r[3],
             "created_at": r[4],
             "status": r[5],
-            "images": images
-        })
-
-    cur.close()
-    conn.close()
-    return result
+            "images": r[6]
+        } for r in rows
+    ]
 
 @router.post("/api/blogger-reviews/{review_id}/{action}")
 def moderate_blogger_review(
     review_id: int,
     action: str,
     comment: str = Form(""),
-    user_id=Depends(get_current_user)
+    user_id=Depends(require_admin),
+    conn=Depends(get_db)
 ):
     if action not in ["approve", "reject"]:
         raise HTTPException(status_code=400, detail="Invalid action")
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
-    cur.execute("SELECT is_admin FROM users WHERE id = %s", (user_id,))
-    is_admin = cur.fetchone()
-    if not is_admin or not is_admin[0]:
-        raise HTTPException(status_code=403, detail="Access denied")
-
     status = "approved" if action == "approve" else "rejected"
     cur.execute("""
         UPDATE blogger_reviews
@@ -224,16 +245,41 @@ def moderate_blogger_review(
 
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": f"Обзор {status}"}
 
+@router.get("/api/blogger-reviews/images")
+def get_reviews_images(ids: str = Query(...), conn=Depends(get_db)):
+    # Изображения сразу нескольких обзоров: ?ids=1,2,3 -> {"1": [...], "2": [...], ...}
+    try:
+        review_ids = sorted({int(item) for item in ids.split(",") if item.strip()})
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid ids")
+    if len(review_ids) > BLOGGER_IMAGES_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Too many ids (max {BLOGGER_IMAGES_MAX_IDS})")
+
+    images = {review_id: [] for review_id in review_ids}
+    if review_ids:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT review_id, image_path
+            FROM blogger_review_images
+            WHERE review_id = ANY(%s)
+            ORDER BY review_id, {IMAGE_ORDER}
+        """, (review_ids,))
+        for review_id, path in cur.fetchall():
+            images[review_id].append(path)
+        cur.close()
+    return images
+
 @router.get("/api/blogger-reviews/{review_id}/images")
-def get_review_images(review_id: int):
-    conn = get_db_connection()
+def get_review_images(review_id: int, conn=Depends(get_db)):
     cur = conn.cursor()
-    cur.execute("SELECT image_path FROM blogger_review_images WHERE review_id = %s", (review_id,))
+    cur.execute(f"""
+        SELECT image_path FROM blogger_review_images
+        WHERE review_id = %s
+        ORDER BY {IMAGE_ORDER}
+    """, (review_id,))
     rows = cur.fetchall()
     cur.close()
-    conn.close()
     return [r[0] for r in rows]
@@ -1,16 +1,16 @@
 from fastapi import APIRouter, HTTPException, Depends, Form
-from .db import get_db_connection
+from .db import get_db
 from .auth import get_current_user
+from .permissions import require_admin
 from datetime import datetime
 
 router = APIRouter()
 
 @router.post("/api/comments/{article_id}")
-def post_comment(article_id: int, text: str = Form(...), user_id: int = Depends(get_current_user)):
+def post_comment(article_id: int, text: str = Form(...), user_id: int = Depends(get_current_user), conn=Depends(get_db)):
     if not text.strip():
         raise HTTPException(status_code=400, detail="Комментарий не может быть пустым")
 
-    conn = get_db_connection()
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -20,13 +20,11 @@ def post_comment(article_id: int, text: str = Form(...), user_id: int = Depends(
 
     conn.commit()
     cursor.close()
-    conn.close()
 
     return {"message": "Комментарий добавлен"}
 
 @router.get("/api/comments/{article_id}")
-def get_comments(article_id: int):
-    conn = get_db_connection()
+def get_comments(article_id: int, conn=Depends(get_db)):
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -40,7 +38,6 @@ def get_comments(article_id: int):
     rows = cursor.fetchall()
 
     cursor.close()
-    conn.close()
 
     return [
         {"text": row[0], "date": row[1].isoformat(), "author": row[2]}
@@ -48,16 +45,9 @@ def get_comments(article_id: int):
     ]
 
 @router.get("/api/admin/comments")
-def get_pending_comments(current_id: int = Depends(get_current_user)):
-    conn = get_db_connection()
+def get_pending_comments(current_id: int = Depends(require_admin), conn=Depends(get_db)):
     cursor = conn.cursor()
 
-    # Проверка прав администратора
-    cursor.execute("SELECT is_admin FROM users WHERE id = %s", (current_id,))
-    is_admin = cursor.fetchone()
-    if not is_admin or not is_admin[0]:
-        raise HTTPException(status_code=403, detail="Access denied")
-
     cursor.execute("""
         SELECT c.id, c.text, c.date, u.username, a.title
         FROM comments c
@@ -68,7 +58,6 @@ def get_pending_comments(current_id: int = Depends(get_current_user)):
     """)
     rows = cursor.fetchall()
     cursor.close()
-    conn.close()
 
     return [
         {
@@ -81,19 +70,12 @@ def get_pending_comments(current_id: int = Depends(get_current_user)):
         for r in rows
     ]
 @router.delete("/api/admin/comments/{comment_id}")
-def delete_comment(comment_id: int, current_id: int = Depends(get_current_user)):
-    conn = get_db_connection()
+def delete_comment(comment_id: int, current_id: int = Depends(require_admin), conn=Depends(get_db)):
     cursor = conn.cursor()
 
-    cursor.execute("SELECT is_admin FROM users WHERE id = %s", (current_id,))
-    is_admin = cursor.fetchone()
-    if not is_admin or not is_admin[0]:
-        raise HTTPException(status_code=403, detail="Access denied")
-
     cursor.execute("DELETE FROM comments WHERE id = %s", (comment_id,))
     conn.commit()
 
     cursor.close()
-    conn.close()
 
     return {"message": "Комментарий удалён"}
\ No newline at end of file
@@ -10,3 +10,77 @@ db_params = {
     "host": "localhost",
     "port": "5432"
 }
+
+# Пул соединений с Postgres (см. app/db.py)
+db_pool_params = {
+    "minconn": 2,
+    "maxconn": 20,
+    "acquire_timeout": 5,
+    "health_check_interval": 30
+}
+
+# Асинхронный пул asyncpg для async def обработчиков
+async_db_pool_params = {
+    "min_size": 2,
+    "max_size": 20,
+    "acquire_timeout": 5,
+    "max_inactive_connection_lifetime": 300
+}
+
+# Кэш проверенных JWT (см. app/tokens.py)
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL = 300
+
+# Кэш ролей пользователей (см. app/permissions.py)
+ROLE_CACHE_SIZE = 10000
+ROLE_CACHE_TTL = 60
+
+# Хэширование паролей (см. app/passwords.py)
+BCRYPT_ROUNDS = 12
+PASSWORD_HASH_CONCURRENCY = 4
+
+# Снимок каталога курортов в памяти (см. app/resort_catalog.py), секунды.
+# Страхует от изменений, сделанных в обход приложения
+RESORT_CATALOG_MAX_AGE = 300
+
+# Обновление погоды из Open-Meteo (см. app/update_weather_open_meteo.py)
+WEATHER_API_URL = "https://api.open-meteo.com/v1/forecast"
+WEATHER_CONCURRENCY = 16
+WEATHER_RETRIES = 3
+WEATHER_TIMEOUT = 10
+WEATHER_BATCH_SIZE = 100     # координат в одном запросе к Open-Meteo
+WEATHER_GRID_STEP = 0.1      # градусов; курорты в одной ячейке делят прогноз
+WEATHER_FRESHNESS = 3 * 3600 # секунд; более свежие данные не перезапрашиваем
+WEATHER_FORECAST_DAYS = 16   # длина сохраняемого ряда снегопада (максимум Open-Meteo)
+
+# Применение схемы при старте (см. app/schema.py)
+SCHEMA_LOCK_KEY = 7_240_513  # ключ advisory-блокировки: DDL применяет один воркер за раз
+
+# Фоновые задачи в процессе приложения (см. app/scheduler.py)
+SCHEDULER_ENABLED = True
+SCHEDULER_LOCK_KEY = 7_240_512   # ключ advisory-блокировки лидера среди воркеров
+SCHEDULER_JITTER = 0.1           # доля интервала для случайного сдвига запуска
+WEATHER_REFRESH_INTERVAL = 3600
+CATALOG_WEATHER_CHECK_INTERVAL = 30  # как часто воркеры сверяют погоду со своим снимком каталога
+
+# Кэш ленты новостей главной страницы (см. app/news.py)
+NEWS_FEED_CACHE_TTL = 60
+
+# Кэш страниц статей с ETag (см. app/article_cache.py)
+ARTICLE_CACHE_SIZE = 1000
+ARTICLE_CACHE_TTL = 300
+
+# Голосование за статьи (см. app/new_page.py, app/article_votes.py).
+# При включённой отложенной записи рейтинг в articles обновляется раз в интервал
+ARTICLE_VOTE_WRITE_BEHIND = False
+ARTICLE_VOTE_FLUSH_INTERVAL = 5
+
+# Кэш карусели последних отзывов (см. app/reviews_cards.py)
+PREVIEW_REVIEWS_CACHE_TTL = 300
+
+# Индекс каталогов галерей (см. app/gallery_index.py): как часто сверять mtime, секунд
+GALLERY_RECHECK_INTERVAL = 5
+
+# Производные изображений: уменьшенные копии и WebP (см. app/image_variants.py)
+IMAGE_VARIANT_WORKERS = 2
+IMAGE_VARIANT_QUALITY = 80
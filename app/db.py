@@ -1,8 +1,171 @@
 # app/db.py
 
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+import asyncpg
 import psycopg2
-from .config import db_params
+from psycopg2 import extensions
+from psycopg2 import pool as pg_pool
+
+from .config import db_params, db_pool_params, async_db_pool_params
+
+
+class PoolTimeoutError(Exception):
+    """Свободное соединение не появилось за acquire_timeout секунд."""
+
+
+class ConnectionPool:
+    def __init__(self, minconn, maxconn, acquire_timeout, health_check_interval, **conn_params):
+        self._pool = pg_pool.ThreadedConnectionPool(minconn, maxconn, **conn_params)
+        # ThreadedConnectionPool при исчерпании сразу бросает PoolError,
+        # семафор даёт ожидание свободного слота с таймаутом
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._maxconn = maxconn
+        self._acquire_timeout = acquire_timeout
+        self._health_check_interval = health_check_interval
+        self._last_used = {}
+
+    def getconn(self):
+        if not self._slots.acquire(timeout=self._acquire_timeout):
+            raise PoolTimeoutError(f"No database connection available within {self._acquire_timeout}s")
+        try:
+            return self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        try:
+            close = bool(conn.closed)
+            if not close and conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                # Обработчик упал или не сделал commit — откатываем незавершённую транзакцию
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+            if close:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn, close=close)
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        self._pool.closeall()
+        self._last_used.clear()
+
+    def _checkout(self):
+        # Битые соединения (например, после перезапуска Postgres) выбрасываем и берём следующее
+        for _ in range(self._maxconn + 1):
+            conn = self._pool.getconn()
+            if self._is_healthy(conn):
+                return conn
+            self._last_used.pop(id(conn), None)
+            self._pool.putconn(conn, close=True)
+        raise psycopg2.OperationalError("Could not obtain a healthy database connection")
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        # Свежие и недавно использованные соединения не пингуем, чтобы не тратить лишний round trip
+        if last_used is None or time.monotonic() - last_used < self._health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def init_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(**db_pool_params, **db_params)
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
 
+
+def get_pool():
+    return _pool or init_pool()
+
+
+@contextmanager
 def get_db_connection():
-    conn = psycopg2.connect(**db_params)
-    return conn
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
+def get_db():
+    # FastAPI-зависимость: соединение вернётся в пул, даже если обработчик упал
+    with get_db_connection() as conn:
+        yield conn
+
+
+# Асинхронный пул (asyncpg) для async def обработчиков: запросы не блокируют event loop.
+# Внимание: asyncpg использует плейсхолдеры $1, $2, ... вместо %s
+
+_async_pool = None
+
+
+async def init_async_pool():
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = await asyncpg.create_pool(
+            database=db_params["dbname"],
+            user=db_params["user"],
+            password=db_params["password"],
+            host=db_params["host"],
+            port=int(db_params["port"]),
+            min_size=async_db_pool_params["min_size"],
+            max_size=async_db_pool_params["max_size"],
+            max_inactive_connection_lifetime=async_db_pool_params["max_inactive_connection_lifetime"]
+        )
+    return _async_pool
+
+
+async def close_async_pool():
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+
+
+@asynccontextmanager
+async def get_async_db_connection():
+    pool = _async_pool or await init_async_pool()
+    try:
+        conn = await pool.acquire(timeout=async_db_pool_params["acquire_timeout"])
+    except asyncio.TimeoutError:
+        raise PoolTimeoutError(f"No database connection available within {async_db_pool_params['acquire_timeout']}s")
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+
+async def get_async_db():
+    async with get_async_db_connection() as conn:
+        yield conn
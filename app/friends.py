@@ -2,8 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import date
-from .db import get_db_connection
+from .db import get_db
 from .auth import get_current_user
+from .image_variants import SIZES, variant_url
 
 router = APIRouter()
 
@@ -23,9 +24,16 @@ class TripOut(BaseModel):
 def normalize_pair(a: int, b: int) -> tuple[int, int]:
     return (a, b) if a < b else (b, a)
 
+def _check_size(size: str):
+    if size not in SIZES:
+        raise HTTPException(status_code=400, detail="Invalid size")
+
 @router.get("/api/friends/list", response_model=List[UserPublic])
-def get_friends(user_id: int = Depends(get_current_user)):
-    conn = get_db_connection()
+def get_friends(user_id: int = Depends(get_current_user),
+    size: str = Query("thumb"),  # аватары в списке — уменьшенная копия
+    conn=Depends(get_db)
+):
+    _check_size(size)
     cur = conn.cursor()
 
     cur.execute("""
@@ -41,12 +49,11 @@ def get_friends(user_id: int = Depends(get_current_user)):
 
     rows = cur.fetchall()
     cur.close()
-    conn.close()
-    return [UserPublic(id=r[0], username=r[1], photo=r[2]) for r in rows]
+    return [UserPublic(id=r[0], username=r[1], photo=variant_url(r[2], size)) for r in rows]
 
 @router.get("/api/friends/requests", response_model=List[UserPublic])
-def get_incoming_requests(user_id: int = Depends(get_current_user)):
-    conn = get_db_connection()
+def get_incoming_requests(user_id: int = Depends(get_current_user), size: str = Query("thumb"), conn=Depends(get_db)):
+    _check_size(size)
     cur = conn.cursor()
 
     cur.execute("""
@@ -63,12 +70,11 @@ def get_incoming_requests(user_id: int = Depends(get_current_user)):
 
     rows = cur.fetchall()
     cur.close()
-    conn.close()
-    return [UserPublic(id=r[0], username=r[1], photo=r[2]) for r in rows]
+    return [UserPublic(id=r[0], username=r[1], photo=variant_url(r[2], size)) for r in rows]
 
 @router.get("/api/friends/outgoing", response_model=List[UserPublic])
-def get_outgoing_requests(user_id: int = Depends(get_current_user)):
-    conn = get_db_connection()
+def get_outgoing_requests(user_id: int = Depends(get_current_user), size: str = Query("thumb"), conn=Depends(get_db)):
+    _check_size(size)
     cur = conn.cursor()
 
     cur.execute("""
@@ -85,17 +91,15 @@ def get_outgoing_requests(user_id: int = Depends(get_current_user)):
 
     rows = cur.fetchall()
     cur.close()
-    conn.close()
-    return [UserPublic(id=r[0], username=r[1], photo=r[2]) for r in rows]
+    return [UserPublic(id=r[0], username=r[1], photo=variant_url(r[2], size)) for r in rows]
 
 @router.post("/api/friends/add/{target_id}")
-def send_friend_request(target_id: int, user_id: int = Depends(get_current_user)):
+def send_friend_request(target_id: int, user_id: int = Depends(get_current_user), conn=Depends(get_db)):
     if target_id == user_id:
         raise HTTPException(400, detail="Нельзя добавить себя")
 
     uid1, uid2 = normalize_pair(user_id, target_id)
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
     cur.execute("""
@@ -112,14 +116,12 @@ def send_friend_request(target_id: int, user_id: int = Depends(get_current_user)
 
     conn.commit()
     cur.close()
-    conn.close()
     return {"message": "Заявка отправлена"}
 
 @router.post("/api/friends/accept/{requester_id}")
-def accept_friend(requester_id: int, user_id: int = Depends(get_current_user)):
+def accept_friend(requester_id: int, user_id: int = Depends(get_current_user), conn=Depends(get_db)):
     uid1, uid2 = normalize_pair(user_id, requester_id)
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
     cur.execute("""
@@ -133,14 +135,12 @@ def accept_friend(requester_id: int, user_id: int = Depends(get_current_user)):
 
     conn.commit()
     cur.close()
-    conn.close()
     return {"message": "Принято"}
 
 @router.post("/api/friends/decline/{requester_id}")
-def decline_friend(requester_id: int, user_id: int = Depends(get_current_user)):
+def decline_friend(requester_id: int, user_id: int = Depends(get_current_user), conn=Depends(get_db)):
     uid1, uid2 = normalize_pair(user_id, requester_id)
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
     cur.execute("""
@@ -151,14 +151,12 @@ def decline_friend(requester_id: int, user_id: int = Depends(get_current_user)):
 
     conn.commit()
     cur.close()
-    conn.close()
     return {"message": "Отклонено"}
 
 @router.delete("/api/friends/remove/{friend_id}")
-def remove_friend(friend_id: int, user_id: int = Depends(get_current_user)):
+def remove_friend(friend_id: int, user_id: int = Depends(get_current_user), conn=Depends(get_db)):
     uid1, uid2 = normalize_pair(user_id, friend_id)
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
     cur.execute("""
@@ -168,15 +166,16 @@ def remove_friend(friend_id: int, user_id: int = Depends(get_current_user)):
 
     conn.commit()
     cur.close()
-    conn.close()
     return {"message": "Удалено из друзей"}
 
 @router.get("/api/users/search", response_model=List[UserPublic])
 def search_users(
     query: str = Query(...),
-    user_id: int = Depends(get_current_user)
+    size: str = Query("thumb"),
+    user_id: int = Depends(get_current_user),
+    conn=Depends(get_db)
 ):
-    conn = get_db_connection()
+    _check_size(size)
     cur = conn.cursor()
 
     cur.execute("""
@@ -196,19 +195,18 @@ def search_users(
         {
             "id": row[0],
             "username": row[1],
-            "photo": row[2],
+            "photo": variant_url(row[2], size),
             "is_friend": row[3],
         }
         for row in cur.fetchall()
     ]
 
     cur.close()
-    conn.close()
     return users
 
 @router.get("/api/users/{user_id}")
-def get_user_by_id(user_id: int, current_user: int = Depends(get_current_user)):
-    conn = get_db_connection()
+def get_user_by_id(user_id: int, size: str = Query("original"), current_user: int = Depends(get_current_user), conn=Depends(get_db)):
+    _check_size(size)
     cur = conn.cursor()
 
     cur.execute("""
@@ -235,7 +233,6 @@ def get_user_by_id(user_id: int, current_user: int = Depends(get_current_user)):
 
     row = cur.fetchone()
     cur.close()
-    conn.close()
 
     if not row:
         raise HTTPException(404, detail="Пользователь не найден")
@@ -243,7 +240,7 @@ def get_user_by_id(user_id: int, current_user: int = Depends(get_current_user)):
     return {
         "id": row[0],
         "username": row[1],
-        "photo": row[2],
+        "photo": variant_url(row[2], size),
         "description": row[3],
         "email": row[4],
         "friend_status": row[5],  # "friend", "pending", "none"
@@ -251,8 +248,7 @@ def get_user_by_id(user_id: int, current_user: int = Depends(get_current_user)):
 
 
 @router.get("/api/trips/{user_id}", response_model=List[TripOut])
-def get_trips_for_user(user_id: int, current_user: int = Depends(get_current_user)):
-    conn = get_db_connection()
+def get_trips_for_user(user_id: int, current_user: int = Depends(get_current_user), conn=Depends(get_db)):
     cur = conn.cursor()
 
     # Проверка, являются ли друзьями
@@ -277,7 +273,6 @@ def get_trips_for_user(user_id: int, current_user: int = Depends(get_current_use
 
     trips = cur.fetchall()
     cur.close()
-    conn.close()
 
     return [
         {
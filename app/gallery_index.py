@@ -0,0 +1,100 @@
+# app/gallery_index.py
+
+import os
+import threading
+import time
+from pathlib import Path
+
+from .config import GALLERY_RECHECK_INTERVAL
+from .image_variants import VARIANTS, VARIANTS_DIR
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+# Каталоги галерей, которые индексируются при старте
+GALLERY_ROOTS = [("images", "resorts"), ("images", "hotels")]
+
+
+class GalleryIndex:
+    # Списки изображений галерей в памяти процесса. Каталог перечитывается, только если
+    # изменился его mtime или mtime подкаталога производных (добавление или удаление файла);
+    # сами mtime проверяются не чаще раза в recheck_interval секунд
+    def __init__(self, static_dir, recheck_interval):
+        self.static_dir = static_dir
+        self.recheck_interval = recheck_interval
+        self._entries = {}    # относительный путь каталога -> (mtime_ns, checked_at, images)
+        self._generations = {}  # относительный путь каталога -> номер сброса invalidate()
+        self._lock = threading.Lock()
+
+    def build(self):
+        for root in GALLERY_ROOTS:
+            root_dir = self.static_dir.joinpath(*root)
+            if not root_dir.is_dir():
+                continue
+            for dirpath, dirnames, _ in os.walk(root_dir):
+                if VARIANTS_DIR in dirnames:
+                    dirnames.remove(VARIANTS_DIR)
+                self.get(Path(dirpath).relative_to(self.static_dir).parts)
+
+    def get(self, parts):
+        # parts — путь каталога относительно static; None, если каталога нет
+        key = "/".join(str(part) for part in parts)
+        # Поколение читаем до записи кэша и обхода каталога: если invalidate() сработает
+        # в это время, результат может быть устаревшим и не сохраняется
+        generation = self._generations.get(key, 0)
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now - entry[1] < self.recheck_interval:
+            return entry[2]
+
+        directory = self.static_dir / key
+        try:
+            mtime_ns = (os.stat(directory).st_mtime_ns, self._variants_mtime(directory))
+        except (FileNotFoundError, NotADirectoryError):
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+
+        if entry is not None and entry[0] == mtime_ns:
+            images = entry[2]
+        else:
+            images = self._scan(directory, key)
+        with self._lock:
+            if self._generations.get(key, 0) == generation:
+                self._entries[key] = (mtime_ns, now, images)
+        return images
+
+    def invalidate(self, parts):
+        key = "/".join(str(part) for part in parts)
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self._entries.pop(key, None)
+
+    def _variants_mtime(self, directory):
+        try:
+            return os.stat(directory / VARIANTS_DIR).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _scan(self, directory, key):
+        names = sorted(entry.name for entry in os.scandir(directory) if entry.name != VARIANTS_DIR)
+        try:
+            variant_names = set(os.listdir(directory / VARIANTS_DIR))
+        except FileNotFoundError:
+            variant_names = set()
+
+        images = []
+        for i, name in enumerate(names):
+            ext = os.path.splitext(name)[1]
+            if ext.lower() not in IMAGE_EXTENSIONS:
+                continue
+            variants = {
+                variant: f"/static/{key}/{VARIANTS_DIR}/{name}.{variant}.webp"
+                for variant in VARIANTS
+                if f"{name}.{variant}.webp" in variant_names
+            }
+            images.append({"id": i + 1, "image": f"/static/{key}/{name}", "variants": variants})
+        return images
+
+
+gallery_index = GalleryIndex(STATIC_DIR, GALLERY_RECHECK_INTERVAL)
@@ -1,13 +1,12 @@
 # --- FastAPI backend endpoint ---
-from fastapi import APIRouter, HTTPException
-from .db import get_db_connection
+from fastapi import APIRouter, HTTPException, Depends
+from .db import get_db
 
 router = APIRouter()
 
 @router.get("/api/resorts/{resort_id}/hotels")
-def get_hotels_by_resort(resort_id: int):
+def get_hotels_by_resort(resort_id: int, conn=Depends(get_db)):
     try:
-        conn = get_db_connection()
         cur = conn.cursor()
 
         cur.execute("""
@@ -23,7 +22,6 @@ def get_hotels_by_resort(resort_id: int):
 
         rows = cur.fetchall()
         cur.close()
-        conn.close()
 
         result = []
         for row in rows:
@@ -0,0 +1,125 @@
+# app/image_variants.py
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .cache import TTLCache
+from .config import IMAGE_VARIANT_WORKERS, IMAGE_VARIANT_QUALITY
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # без Pillow производные не создаются, отдаются оригиналы
+    Image = None
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+
+# Производные лежат рядом с оригиналом: <каталог>/_variants/<имя файла с расширением>.<вариант>.webp.
+# Расширение в имени нужно, чтобы a.jpg и a.png в одном каталоге не делили производные
+VARIANTS_DIR = "_variants"
+
+# Вариант -> максимальная сторона в пикселях (None — исходный размер, только WebP)
+VARIANTS = {
+    "thumb": 320,
+    "medium": 1024,
+    "webp": None,
+}
+
+SIZES = ["original", *VARIANTS]
+
+_executor = None
+
+# Есть ли файл производной. Отрицательный ответ перепроверяем часто — производная может
+# появиться, пока идёт обработка; положительный — реже, его снимает remove_variants
+_existing = TTLCache(maxsize=10000, ttl=600)
+_missing = TTLCache(maxsize=10000, ttl=30)
+
+
+def variant_file(original: Path, variant: str) -> Path:
+    return original.parent / VARIANTS_DIR / f"{original.name}.{variant}.webp"
+
+
+def generate_variants(path: str) -> list:
+    # Выполняется в процессе пула: уменьшенные копии и WebP для одного загруженного файла
+    original = Path(path)
+    created = []
+    with Image.open(original) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        (original.parent / VARIANTS_DIR).mkdir(exist_ok=True)
+        for variant, max_side in VARIANTS.items():
+            resized = image.copy()
+            if max_side is not None:
+                resized.thumbnail((max_side, max_side))
+            target = variant_file(original, variant)
+            # Запись через временный файл: читатели не увидят недописанную картинку
+            tmp = target.with_name(target.name + ".tmp")
+            resized.save(tmp, "WEBP", quality=IMAGE_VARIANT_QUALITY, method=4)
+            os.replace(tmp, target)
+            created.append(str(target))
+    return created
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # spawn: дочерние процессы не наследуют потоки и соединения сервера
+        _executor = ProcessPoolExecutor(
+            max_workers=IMAGE_VARIANT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def _log_failure(future):
+    error = future.exception()
+    if error is not None:
+        print(f"[image_variants] Ошибка обработки изображения: {error}")
+
+
+def schedule_variants(paths):
+    # Вызывается после сохранения загруженных файлов; запрос не ждёт обработки
+    if Image is None:
+        return
+    executor = _get_executor()
+    for path in paths:
+        executor.submit(generate_variants, str(Path(path).resolve())).add_done_callback(_log_failure)
+
+
+def variant_url(url, size):
+    # URL нужного размера для /static/... пути; пока производной нет — оригинал
+    if not url or size == "original" or size not in VARIANTS or not url.startswith("/static/"):
+        return url
+    original = STATIC_DIR / url[len("/static/"):]
+    target = variant_file(original, size)
+    key = str(target)
+    if not _existing.get(key):
+        if _missing.get(key):
+            return url
+        if not target.exists():
+            _missing.set(key, True)
+            return url
+        _existing.set(key, True)
+    return "/static/" + target.relative_to(STATIC_DIR).as_posix()
+
+
+def remove_variants(url):
+    # Удаляет производные вместе с оригиналом; url — /static/... путь оригинала
+    if not url or not url.startswith("/static/"):
+        return
+    original = STATIC_DIR / url[len("/static/"):]
+    for variant in VARIANTS:
+        target = variant_file(original, variant)
+        _existing.pop(str(target))
+        _missing.pop(str(target))
+        try:
+            target.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def shutdown_executor():
+    if _executor is not None:
+        _executor.shutdown(wait=False)
@@ -1,5 +1,7 @@
 # app/main.py
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from starlette.middleware import Middleware
 from fastapi.middleware.cors import CORSMiddleware
 from app.auth import router as auth_router
@@ -24,10 +26,69 @@ from app.comments import router as comments_router
 from app.bloggers import router as bloggers_router
 from app.friends import router as friends_router
 from app.trips import router as trips_router
+from app.db import init_pool, close_pool, init_async_pool, close_async_pool, PoolTimeoutError
+from app.passwords import shutdown_executor as shutdown_password_executor
+from app.image_variants import shutdown_executor as shutdown_image_executor
+from app.resort_catalog import resort_catalog
+from app.schema import ensure_schema
+from app.gallery_index import gallery_index
+from app.scheduler import scheduler
+from app.update_weather_open_meteo import refresh_weather
+from app.article_votes import vote_counter
+from app.config import (
+    SCHEDULER_ENABLED, SCHEDULER_JITTER, WEATHER_REFRESH_INTERVAL, CATALOG_WEATHER_CHECK_INTERVAL,
+    ARTICLE_VOTE_WRITE_BEHIND, ARTICLE_VOTE_FLUSH_INTERVAL
+)
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 import os
 
-app = FastAPI()
+
+def refresh_weather_job():
+    stats = refresh_weather()
+    # Погода влияет на фильтры селектора — пересобираем снимок каталога.
+    # Остальные воркеры узнают об обновлении через задачу catalog_weather
+    if stats["updated"]:
+        resort_catalog.rebuild()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_pool()
+    await init_async_pool()
+    await run_in_threadpool(ensure_schema)
+    await run_in_threadpool(resort_catalog.rebuild)
+    await run_in_threadpool(gallery_index.build)
+    if SCHEDULER_ENABLED:
+        scheduler.add_job("weather", refresh_weather_job, WEATHER_REFRESH_INTERVAL, SCHEDULER_JITTER)
+        # Снимок каталога у каждого воркера свой, поэтому проверяет каждый
+        scheduler.add_job(
+            "catalog_weather", resort_catalog.check_weather, CATALOG_WEATHER_CHECK_INTERVAL, SCHEDULER_JITTER,
+            leader_only=False
+        )
+    if ARTICLE_VOTE_WRITE_BEHIND:
+        # Счётчики у каждого воркера свои, поэтому сбрасывает каждый, а не только лидер
+        scheduler.add_job(
+            "article_votes", vote_counter.flush, ARTICLE_VOTE_FLUSH_INTERVAL, SCHEDULER_JITTER,
+            leader_only=False
+        )
+    scheduler.start()
+    yield
+    await scheduler.stop()
+    await run_in_threadpool(vote_counter.flush)
+    await close_async_pool()
+    close_pool()
+    shutdown_password_executor()
+    shutdown_image_executor()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    # Все соединения заняты — просим клиента повторить запрос позже
+    return JSONResponse(status_code=503, content={"detail": "Сервис перегружен, попробуйте позже"})
 
 app.mount(
     "/static",
@@ -1,49 +1,81 @@
-from fastapi import APIRouter, HTTPException
-from .db import get_db_connection
+from fastapi import APIRouter, HTTPException, Header, Response
+from fastapi.responses import JSONResponse
+from typing import Optional
+from .db import get_db, get_db_connection, PoolTimeoutError
 from fastapi import Depends
 from .auth import get_current_user
+from .article_cache import get_cached_article, cache_article, etag_matches, invalidate_article
+from .article_votes import vote_counter
+from .config import ARTICLE_VOTE_WRITE_BEHIND
 
 
 
 router = APIRouter()
 
 @router.post("/api/newsPage/{article_id}/vote")
-def vote_article(article_id: int, user_id: int = Depends(get_current_user)):
-    conn = get_db_connection()
+def vote_article(article_id: int, user_id: int = Depends(get_current_user), conn=Depends(get_db)):
     cursor = conn.cursor()
 
-    # Проверка: уже голосовал?
-    cursor.execute("SELECT 1 FROM article_votes WHERE user_id = %s AND article_id = %s", (user_id, article_id))
-    if cursor.fetchone():
-        raise HTTPException(status_code=400, detail="Вы уже голосовали за эту статью")
+    if ARTICLE_VOTE_WRITE_BEHIND:
+        # Фиксируем только сам голос, рейтинг пересчитает периодический сброс счётчика
+        cursor.execute("""
+            INSERT INTO article_votes (user_id, article_id)
+            SELECT %s, id FROM articles WHERE id = %s
+            ON CONFLICT (user_id, article_id) DO NOTHING
+            RETURNING article_id
+        """, (user_id, article_id))
+        voted = cursor.fetchone() is not None
+        conn.commit()
+        if voted:
+            vote_counter.add(article_id)
+    else:
+        # Голос и рейтинг — одним оператором; дубль отсекает уникальный индекс
+        cursor.execute("""
+            WITH vote AS (
+                INSERT INTO article_votes (user_id, article_id)
+                SELECT %s, id FROM articles WHERE id = %s
+                ON CONFLICT (user_id, article_id) DO NOTHING
+                RETURNING article_id
+            )
+            UPDATE articles
+            SET rating = COALESCE(rating, 0) + 1
+            WHERE id IN (SELECT article_id FROM vote)
+            RETURNING id
+        """, (user_id, article_id))
+        voted = cursor.fetchone() is not None
+        conn.commit()
+        if voted:
+            invalidate_article(article_id)
 
-    # Обновляем рейтинг
-    cursor.execute("UPDATE articles SET rating = COALESCE(rating, 0) + 1 WHERE id = %s", (article_id,))
-    # Сохраняем, что пользователь проголосовал
-    cursor.execute("INSERT INTO article_votes (user_id, article_id) VALUES (%s, %s)", (user_id, article_id))
+    if not voted:
+        cursor.execute("SELECT 1 FROM articles WHERE id = %s", (article_id,))
+        exists = cursor.fetchone() is not None
+        cursor.close()
+        if not exists:
+            raise HTTPException(status_code=404, detail="Article not found")
+        raise HTTPException(status_code=400, detail="Вы уже голосовали за эту статью")
 
-    conn.commit()
     cursor.close()
-    conn.close()
-
     return {"message": "Голос засчитан"}
-@router.get("/api/newsPage/{article_id}")
-def get_article_by_id(article_id: int):
-    try:
-        conn = get_db_connection()
+
+
+def _load_article(article_id):
+    with get_db_connection() as conn:
         cursor = conn.cursor()
 
         cursor.execute("""
-            SELECT a.id, a.title, a.content, a.publication_date, u.username, ai.image_path, a.rating
+            SELECT a.id, a.title, a.content, a.publication_date, u.username,
+                   (SELECT image_path FROM article_images ai WHERE ai.article_id = a.id ORDER BY ai.id LIMIT 1),
+                   a.rating
             FROM articles a
             JOIN users u ON a.author_id = u.id
-            LEFT JOIN article_images ai ON a.id = ai.article_id
             WHERE a.id = %s
         """, (article_id,))
         row = cursor.fetchone()
 
         if row is None:
-            raise HTTPException(status_code=404, detail="Article not found")
+            cursor.close()
+            return None
 
         # Получаем теги отдельно
         cursor.execute("""
@@ -54,22 +86,42 @@ def get_article_by_id(article_id: int):
         """, (article_id,))
         tag_rows = cursor.fetchall()
         tags = [tag[0] for tag in tag_rows]
+        cursor.close()
+
+    return {
+        "id": row[0],
+        "title": row[1],
+        "content": row[2],
+        "publication_date": row[3].isoformat(),
+        "author": row[4],
+        "image": row[5],
+        "rating": float(row[6]) if row[6] is not None else 0.0,
+        "tags": tags
+    }
+
 
-        return {
-            "id": row[0],
-            "title": row[1],
-            "content": row[2],
-            "publication_date": row[3].isoformat(),
-            "author": row[4],
-            "image": row[5],
-            "rating": float(row[6]) if row[6] is not None else 0.0,
-            "tags": tags
-        }
+@router.get("/api/newsPage/{article_id}")
+def get_article_by_id(article_id: int, if_none_match: Optional[str] = Header(None)):
+    try:
+        cached = get_cached_article(article_id)
+        if cached is None:
+            body = _load_article(article_id)
+            if body is None:
+                raise HTTPException(status_code=404, detail="Article not found")
+            etag = cache_article(article_id, body)
+        else:
+            etag, body = cached
+
+        # Браузер хранит ответ, но каждый раз сверяет ETag; совпадение — пустой 304
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(content=body, headers=headers)
 
+    except HTTPException:
+        raise
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         print(f"[ERROR] {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
-
-    finally:
-        cursor.close()
-        conn.close()
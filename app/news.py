@@ -1,33 +1,55 @@
 # app/news.py
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends
-from .db import get_db_connection
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, Query
+from .db import get_async_db, get_async_db_connection, PoolTimeoutError
 from .auth import get_current_user
+from .permissions import require_admin
+from .cache import TTLCache
+from .article_cache import invalidate_article
+from .config import NEWS_FEED_CACHE_TTL
+from .image_variants import VARIANTS_DIR, remove_variants, schedule_variants, variant_url
 import os
+import shutil
 import uuid
 import json
 
 
 router = APIRouter()
 
+# Лента главной страницы и облако тегов. Сбрасываются при публикации и удалении статей;
+# TTL — страховка для изменений, сделанных другими воркерами
+_latest_news = TTLCache(maxsize=1, ttl=NEWS_FEED_CACHE_TTL)
+_tag_cloud = TTLCache(maxsize=16, ttl=NEWS_FEED_CACHE_TTL)
+_latest_news_generation = 0
+
+
+def invalidate_news_feeds():
+    global _latest_news_generation
+    _latest_news_generation += 1
+    _latest_news.clear()
+    _tag_cloud.clear()
+
+
 @router.get("/api/news")
 async def get_latest_news():
+    # Соединение с БД берём только при промахе кэша
+    cached = _latest_news.get("latest")
+    if cached is not None:
+        return cached
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT a.id, a.title, a.content, a.publication_date, ai.image_path
-            FROM articles a
-             LEFT JOIN article_images ai ON a.id = ai.article_id
-             WHERE a.is_published = TRUE
-            ORDER BY a.publication_date DESC
-            LIMIT 4
-        """)
-        news = cursor.fetchall()
-
-        cursor.close()
-        conn.close()
+        # Если ленту сбросили, пока шёл запрос, устаревший результат в кэш не кладём
+        generation = _latest_news_generation
+        # По одной строке на статью: обложка — первое изображение статьи
+        async with get_async_db_connection() as conn:
+            news = await conn.fetch("""
+                SELECT a.id, a.title, a.content, a.publication_date,
+                       (SELECT image_path FROM article_images ai WHERE ai.article_id = a.id ORDER BY ai.id LIMIT 1)
+                FROM articles a
+                WHERE a.is_published = TRUE
+                ORDER BY a.publication_date DESC, a.id DESC
+                LIMIT 4
+            """)
 
         news_list = []
         for item in news:
@@ -36,72 +58,170 @@ async def get_latest_news():
                 "title": item[1],
                 "content": item[2],
                 "publication_date": item[3].isoformat(),  # чтобы дата шла в формате строки
-                "image": item[4]
+                "image": variant_url(item[4], "medium")
             })
 
+        if generation == _latest_news_generation:
+            _latest_news.set("latest", news_list)
         return news_list
 
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         print(f"Database error: {e}")
         raise HTTPException(status_code=500, detail="Ошибка сервера")
 
 
 
+@router.get("/api/news/tags")
+async def get_tag_cloud(limit: int = Query(50, ge=1, le=200)):
+    # Облако тегов: число опубликованных статей с каждым тегом
+    cached = _tag_cloud.get(limit)
+    if cached is not None:
+        return cached
+
+    generation = _latest_news_generation
+    async with get_async_db_connection() as conn:
+        rows = await conn.fetch("""
+            SELECT t.name, COUNT(*) AS articles
+            FROM article_tag at
+            JOIN tag t ON t.id = at.tag_id
+            JOIN articles a ON a.id = at.article_id
+            WHERE a.is_published = TRUE
+            GROUP BY t.name
+            ORDER BY articles DESC, t.name
+            LIMIT $1
+        """, limit)
+
+    cloud = [{"name": row[0], "count": row[1]} for row in rows]
+    if generation == _latest_news_generation:
+        _tag_cloud.set(limit, cloud)
+    return cloud
+
+
+NEWS_SEARCH_MAX_LIMIT = 50
+NEWS_SEARCH_MAX_OFFSET = 1000
+
+# Поиск по GIN-индексу search_vector с ранжированием ts_rank_cd;
+# подсветку (ts_headline) считаем только для строк текущей страницы.
+# Тот же запрос замеряет scripts/bench_search.py
+SEARCH_SQL = """
+    WITH query AS (SELECT websearch_to_tsquery('russian', $1) AS q),
+    page AS (
+        SELECT a.id, a.title, a.content, a.publication_date,
+               ts_rank_cd(a.search_vector, query.q) AS rank
+        FROM articles a, query
+        WHERE a.is_published = TRUE AND a.search_vector @@ query.q
+        ORDER BY rank DESC, a.publication_date DESC, a.id DESC
+        LIMIT $2 OFFSET $3
+    )
+    SELECT page.id, page.title, page.publication_date, page.rank,
+           ts_headline('russian', page.title, query.q,
+                       'StartSel=<mark>, StopSel=</mark>, HighlightAll=true'),
+           ts_headline('russian', page.content, query.q,
+                       'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=30, MinWords=10'),
+           (SELECT image_path FROM article_images ai WHERE ai.article_id = page.id ORDER BY ai.id LIMIT 1)
+    FROM page, query
+    ORDER BY page.rank DESC, page.publication_date DESC, page.id DESC
+"""
+
+
+@router.get("/api/news/search")
+async def search_news(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=NEWS_SEARCH_MAX_LIMIT),
+    offset: int = Query(0, ge=0, le=NEWS_SEARCH_MAX_OFFSET),
+    conn=Depends(get_async_db)
+):
+    rows = await conn.fetch(SEARCH_SQL, q, limit, offset)
+
+    return [
+        {
+            "id": row[0],
+            "title": row[1],
+            "publication_date": row[2].isoformat(),
+            "rank": round(float(row[3]), 4),
+            "title_highlight": row[4],
+            "snippet": row[5],
+            "image": variant_url(row[6], "thumb")
+        }
+        for row in rows
+    ]
+
+
 @router.post("/api/news/create")
 async def create_article(
     title: str = Form(...),
     content: str = Form(...),
     tags: str = Form(""),  # JSON-строка со списком тегов
     image: UploadFile = File(None),
-    user_id: int = Depends(get_current_user)
+    user_id: int = Depends(get_current_user),
+    conn=Depends(get_async_db)
 ):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Сохранение статьи
-        cursor.execute("""
-            INSERT INTO articles (author_id, title, content, publication_date, is_published)
-            VALUES (%s, %s, %s, NOW(), FALSE)
-            RETURNING id
-        """, (user_id, title, content))
-        article_id = cursor.fetchone()[0]
-
-        # Загрузка изображения
-        if image:
-            folder = f"app/static/images/articles/{article_id}"
-            os.makedirs(folder, exist_ok=True)
-            filename = f"{uuid.uuid4().hex}_{image.filename}"
-            full_path = os.path.join(folder, filename)
-            with open(full_path, "wb") as f:
-                f.write(await image.read())
-            rel_path = f"/static/images/articles/{article_id}/{filename}"
-            cursor.execute("""
-                INSERT INTO article_images (article_id, image_path)
-                VALUES (%s, %s)
-            """, (article_id, rel_path))
-
-        # Обработка тегов
-        if tags:
-            tag_list = json.loads(tags)  # ожидаем JSON-строку: ["снег", "спорт"]
-            for tag_name in tag_list:
-                # если тега нет — добавить
-                cursor.execute("SELECT id FROM tag WHERE name = %s", (tag_name,))
-                tag = cursor.fetchone()
-                if not tag:
-                    cursor.execute("INSERT INTO tag (name) VALUES (%s) RETURNING id", (tag_name,))
-                    tag_id = cursor.fetchone()[0]
-                else:
-                    tag_id = tag[0]
-                # добавляем в article_tag
-                cursor.execute("""
-                    INSERT INTO article_tag (article_id, tag_id)
-                    VALUES (%s, %s)
-                """, (article_id, tag_id))
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+        async with conn.transaction():
+            # Сохранение статьи
+            article_id = await conn.fetchval("""
+                INSERT INTO articles (author_id, title, content, publication_date, is_published)
+                VALUES ($1, $2, $3, NOW(), FALSE)
+                RETURNING id
+            """, user_id, title, content)
+
+            # Загрузка изображения
+            if image:
+                folder = f"app/static/images/articles/{article_id}"
+                os.makedirs(folder, exist_ok=True)
+                filename = f"{uuid.uuid4().hex}_{image.filename}"
+                full_path = os.path.join(folder, filename)
+                with open(full_path, "wb") as f:
+                    f.write(await image.read())
+                schedule_variants([full_path])
+                rel_path = f"/static/images/articles/{article_id}/{filename}"
+                await conn.execute("""
+                    INSERT INTO article_images (article_id, image_path)
+                    VALUES ($1, $2)
+                """, article_id, rel_path)
+
+            # Обработка тегов: недостающие теги и связи со статьёй — одним оператором
+            if tags:
+                tag_list = json.loads(tags)  # ожидаем JSON-строку: ["снег", "спорт"]
+                tag_names = [name.strip() for name in tag_list if name and name.strip()]
+                if tag_names:
+                    linked = await conn.fetchval("""
+                        WITH names AS (
+                            SELECT DISTINCT unnest($2::text[]) AS name
+                        ),
+                        inserted AS (
+                            -- DO NOTHING не блокирует и не переписывает существующие теги
+                            INSERT INTO tag (name)
+                            SELECT name FROM names
+                            ON CONFLICT (name) DO NOTHING
+                            RETURNING id
+                        ),
+                        all_tags AS (
+                            SELECT id FROM inserted
+                            UNION
+                            SELECT id FROM tag WHERE name = ANY($2::text[])
+                        ),
+                        links AS (
+                            INSERT INTO article_tag (article_id, tag_id)
+                            SELECT $1, id FROM all_tags
+                            RETURNING tag_id
+                        )
+                        SELECT COUNT(*) FROM links
+                    """, article_id, tag_names)
+                    if linked < len(set(tag_names)):
+                        # Тег создал параллельный запрос уже после снимка первого оператора:
+                        # новый оператор его видит — дописываем недостающие связи
+                        await conn.execute("""
+                            INSERT INTO article_tag (article_id, tag_id)
+                            SELECT $1, t.id FROM tag t
+                            WHERE t.name = ANY($2::text[])
+                              AND NOT EXISTS (
+                                  SELECT 1 FROM article_tag at
+                                  WHERE at.article_id = $1 AND at.tag_id = t.id
+                              )
+                        """, article_id, tag_names)
 
         return {"message": "Черновик отправлен на модерацию"}
 
@@ -111,28 +231,15 @@ async def create_article(
 
 
 @router.get("/api/news/unpublished")
-async def get_unpublished_articles(user_id: int = Depends(get_current_user)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Проверка прав
-    cursor.execute("SELECT is_admin FROM users WHERE id = %s", (user_id,))
-    is_admin = cursor.fetchone()
-    if not is_admin or not is_admin[0]:
-        raise HTTPException(status_code=403, detail="Access denied")
-
-    cursor.execute("""
+async def get_unpublished_articles(user_id: int = Depends(require_admin), conn=Depends(get_async_db)):
+    articles = await conn.fetch("""
         SELECT a.id, a.title, a.content, a.publication_date, u.username,
-               (SELECT image_path FROM article_images ai WHERE ai.article_id = a.id LIMIT 1)
+               (SELECT image_path FROM article_images ai WHERE ai.article_id = a.id ORDER BY ai.id LIMIT 1)
         FROM articles a
         JOIN users u ON a.author_id = u.id
         WHERE a.is_published = FALSE
         ORDER BY a.publication_date DESC
     """)
-    articles = cursor.fetchall()
-
-    cursor.close()
-    conn.close()
 
     return [
         {
@@ -147,59 +254,42 @@ async def get_unpublished_articles(user_id: int = Depends(get_current_user)):
     ]
 
 @router.post("/api/news/publish/{article_id}")
-async def publish_article(article_id: int, user_id: int = Depends(get_current_user)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT is_admin FROM users WHERE id = %s", (user_id,))
-    if not cursor.fetchone()[0]:
-        raise HTTPException(status_code=403, detail="Access denied")
-
-    cursor.execute("UPDATE articles SET is_published = TRUE WHERE id = %s", (article_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+async def publish_article(article_id: int, user_id: int = Depends(require_admin), conn=Depends(get_async_db)):
+    await conn.execute("UPDATE articles SET is_published = TRUE WHERE id = $1", article_id)
+    invalidate_news_feeds()
+    invalidate_article(article_id)
     return {"message": "Статья опубликована"}
 
 @router.delete("/api/news/delete/{article_id}")
-async def delete_article(article_id: int, user_id: int = Depends(get_current_user)):
+async def delete_article(article_id: int, user_id: int = Depends(require_admin), conn=Depends(get_async_db)):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Проверка: пользователь должен быть админом
-        cursor.execute("SELECT is_admin FROM users WHERE id = %s", (user_id,))
-        result = cursor.fetchone()
-        if not result or not result[0]:
-            raise HTTPException(status_code=403, detail="Access denied")
-
         # Удаление изображений из файловой системы
-        cursor.execute("SELECT image_path FROM article_images WHERE article_id = %s", (article_id,))
-        images = cursor.fetchall()
+        images = await conn.fetch("SELECT image_path FROM article_images WHERE article_id = $1", article_id)
         for (path,) in images:
             try:
                 abs_path = os.path.join("app", path.lstrip("/"))
                 if os.path.exists(abs_path):
                     os.remove(abs_path)
+                remove_variants(path)
             except Exception as file_err:
                 print(f"Ошибка при удалении файла: {file_err}")
 
         # Удаление папки, если пустая
         folder_path = os.path.join("app/static/images/articles", str(article_id))
+        shutil.rmtree(os.path.join(folder_path, VARIANTS_DIR), ignore_errors=True)
         if os.path.exists(folder_path):
             try:
                 os.rmdir(folder_path)
             except OSError:
                 pass  # папка не пуста
 
-        # Удаление записей из article_images
-        cursor.execute("DELETE FROM article_images WHERE article_id = %s", (article_id,))
-        # Удаление самой статьи
-        cursor.execute("DELETE FROM articles WHERE id = %s", (article_id,))
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+        async with conn.transaction():
+            # Удаление записей из article_images
+            await conn.execute("DELETE FROM article_images WHERE article_id = $1", article_id)
+            # Удаление самой статьи
+            await conn.execute("DELETE FROM articles WHERE id = $1", article_id)
+        invalidate_news_feeds()
+        invalidate_article(article_id)
 
         return {"message": "Статья и связанные изображения удалены"}
 
@@ -1,46 +1,93 @@
 # app/news_page.py
 
-from fastapi import APIRouter, HTTPException
-from .db import get_db_connection
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from .db import get_db
+from .pagination import encode_cursor, decode_cursor, set_next_cursor
+from .image_variants import variant_url
 
 router = APIRouter()
+
+NEWS_PAGE_SIZE = 20
+NEWS_PAGE_MAX_SIZE = 100
+
+
 @router.get("/api/newsPage")
-def get_all_articles_with_tags():
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def get_all_articles_with_tags(
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    tag: Optional[str] = Query(None),
+    limit: int = Query(NEWS_PAGE_SIZE, ge=1, le=NEWS_PAGE_MAX_SIZE),
+    conn=Depends(get_db)
+):
+    # Keyset-пагинация по (publication_date, id): страница читается по индексу,
+    # и её стоимость не зависит от размера архива
+    after = None
+    if cursor:
+        published, article_id = decode_cursor(cursor, 2)
+        try:
+            after = (datetime.fromisoformat(published), int(article_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
 
-    cursor.execute("""
+    conditions = []
+    params = []
+    if after:
+        conditions.append("AND (a.publication_date, a.id) < (%s, %s)")
+        params.extend(after)
+    if tag:
+        # Фильтр по тегу — по индексу article_tag (tag_id, article_id)
+        conditions.append("""
+          AND EXISTS (
+              SELECT 1 FROM article_tag at JOIN tag t ON t.id = at.tag_id
+              WHERE at.article_id = a.id AND t.name = %s
+          )""")
+        params.append(tag)
+    db_cursor = conn.cursor()
+    db_cursor.execute(f"""
         SELECT a.id, a.title, a.content, a.publication_date, u.username, ai.image_path
         FROM articles a
         JOIN users u ON a.author_id = u.id
-        LEFT JOIN article_images ai ON a.id = ai.article_id
-        WHERE a.is_published = TRUE
-        ORDER BY a.publication_date DESC
-    """)
-    articles = cursor.fetchall()
-
-    result = []
-    for article in articles:
-        article_id = article[0]
-        cursor.execute("""
-            SELECT t.name
-            FROM tag t
-            JOIN article_tag at ON t.id = at.tag_id
-            WHERE at.article_id = %s
-        """, (article_id,))
-        tag_rows = cursor.fetchall()
-        tags = [tag[0] for tag in tag_rows]
-
-        result.append({
+        LEFT JOIN LATERAL (
+            SELECT image_path FROM article_images WHERE article_id = a.id ORDER BY id LIMIT 1
+        ) ai ON TRUE
+        WHERE a.is_published = TRUE {" ".join(conditions)}
+        ORDER BY a.publication_date DESC, a.id DESC
+        LIMIT %s
+    """, (*params, limit + 1))
+    articles = db_cursor.fetchall()
+
+    has_more = len(articles) > limit
+    articles = articles[:limit]
+
+    # Теги всей страницы — одним запросом
+    tags = {}
+    if articles:
+        db_cursor.execute("""
+            SELECT at.article_id, t.name
+            FROM article_tag at
+            JOIN tag t ON t.id = at.tag_id
+            WHERE at.article_id = ANY(%s)
+        """, ([article[0] for article in articles],))
+        for article_id, name in db_cursor.fetchall():
+            tags.setdefault(article_id, []).append(name)
+    db_cursor.close()
+
+    if has_more:
+        last = articles[-1]
+        set_next_cursor(response, encode_cursor(last[3], last[0]))
+
+    return [
+        {
             "id": article[0],
             "title": article[1],
             "content": article[2],
             "publication_date": article[3].isoformat(),
             "author": article[4],
-            "image": article[5],
-            "tags": tags
-        })
-
-    cursor.close()
-    conn.close()
-    return result
+            "image": variant_url(article[5], "medium"),
+            "tags": tags.get(article[0], [])
+        }
+        for article in articles
+    ]
@@ -0,0 +1,30 @@
+# app/pagination.py
+
+import base64
+
+from fastapi import HTTPException
+
+# Курсор keyset-пагинации: значения ключа сортировки последней строки страницы,
+# закодированные в непрозрачную строку. Клиент передаёт её как ?cursor=...
+# Следующий курсор отдаётся в заголовке, тело ответа остаётся списком
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values) -> str:
+    raw = "|".join(value.isoformat() if hasattr(value, "isoformat") else str(value) for value in values)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        values = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def set_next_cursor(response, cursor):
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
@@ -0,0 +1,41 @@
+# app/passwords.py
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from .config import BCRYPT_ROUNDS, PASSWORD_HASH_CONCURRENCY
+
+# bcrypt отпускает GIL, поэтому хватает пула потоков. Размер пула ограничивает число
+# одновременных хэширований, остальные запросы ждут в очереди, не блокируя event loop
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_CONCURRENCY, thread_name_prefix="bcrypt")
+
+
+def _hash(password: str) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode("utf-8")
+
+
+def _verify(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_executor, _hash, password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(_executor, _verify, password, hashed)
+
+
+def needs_rehash(hashed: str) -> bool:
+    # Хэш вида $2b$12$...: второе поле — cost, с которым он был посчитан
+    try:
+        rounds = int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return True
+    return rounds != BCRYPT_ROUNDS
+
+
+def shutdown_executor():
+    _executor.shutdown(wait=False)
@@ -0,0 +1,46 @@
+# app/permissions.py
+
+from fastapi import Depends, HTTPException
+
+from .cache import TTLCache
+from .config import ROLE_CACHE_SIZE, ROLE_CACHE_TTL
+from .db import get_db_connection
+from .tokens import get_current_user
+
+# Короткоживущий кэш ролей пользователей, чтобы не делать SELECT is_admin в каждом обработчике.
+# Сбрасывается явно при блокировке/разблокировке и одобрении заявки блогера
+_roles = TTLCache(maxsize=ROLE_CACHE_SIZE, ttl=ROLE_CACHE_TTL)
+
+
+def get_user_role(user_id: int):
+    role = _roles.get(user_id)
+    if role is not None:
+        return role
+
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT is_admin, is_blogger, is_active FROM users WHERE id = %s", (user_id,))
+        row = cur.fetchone()
+        cur.close()
+
+    if row is None:
+        return None
+
+    role = {
+        "is_admin": bool(row[0]),
+        "is_blogger": bool(row[1]),
+        "is_active": row[2] is not False
+    }
+    _roles.set(user_id, role)
+    return role
+
+
+def invalidate_user_role(user_id: int):
+    _roles.pop(user_id)
+
+
+def require_admin(user_id: int = Depends(get_current_user)) -> int:
+    role = get_user_role(user_id)
+    if not role or not role["is_admin"] or not role["is_active"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    return user_id
@@ -0,0 +1,341 @@
+# app/resort_catalog.py
+
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from .config import RESORT_CATALOG_MAX_AGE
+from .db import get_db_connection
+from .resort_index import ResortIndex
+from .review_rollups import RATING_FIELDS, average_rating_sql
+
+FEATURE_COLUMNS = [
+    "panoramic_trails_above_2500m", "guaranteed_snow", "snowboard_friendly",
+    "night_skiing", "kiting_available", "snowparks_count", "halfpipes_count",
+    "artificial_snow", "forest_trails", "glacier_available", "summer_skiing",
+    "freeride_opportunities", "official_freeride_zones", "backcountry_routes",
+    "heliski_available", "official_freeride_guides", "kids_ski_schools",
+    "fis_certified_trails_count"
+]
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    version: int
+    built_at: datetime
+    resorts: list           # /api/resorts
+    table: list             # /api/resorts-table
+    details: dict           # resort_id -> /api/resorts/{id}
+    features: dict          # resort_id -> /api/resort-features/{id}
+    selector: list          # строки /api/resorts/selector
+    selector_index: ResortIndex
+    snow_forecast: dict     # resort_id -> /api/resorts/{id}/snow-forecast
+
+
+def _load_resorts(cursor):
+    cursor.execute("""
+        SELECT sr.id, sr.name, cr.latitude, cr.longitude
+        FROM ski_resort sr
+        JOIN coordinates_resort cr ON sr.id = cr.resort_id
+    """)
+    return [
+        {"id": r[0], "name": r[1], "latitude": r[2], "longitude": r[3]}
+        for r in cursor.fetchall()
+    ]
+
+
+def _load_table(cursor):
+    cursor.execute("""
+SELECT
+    sr.id,
+    sr.name,
+    sr.trail_length,
+    sr.changes,
+    sr.max_height,
+
+    -- Длина зелёной трассы
+    (SELECT t.trail_length FROM tracks t WHERE t.resort_id = sr.id AND t.trail_type = 'Зелёная' LIMIT 7) AS green,
+    -- Длина синей трассы
+    (SELECT t.trail_length FROM tracks t WHERE t.resort_id = sr.id AND t.trail_type = 'Синяя' LIMIT 7) AS blue,
+    -- Длина красной трассы
+    (SELECT t.trail_length FROM tracks t WHERE t.resort_id = sr.id AND t.trail_type = 'Красная' LIMIT 7) AS red,
+    -- Длина чёрной трассы
+    (SELECT t.trail_length FROM tracks t WHERE t.resort_id = sr.id AND t.trail_type = 'Чёрная' LIMIT 7) AS black,
+
+    -- Подъёмники
+    STRING_AGG(CONCAT(tl.lift_type, ': ', tl.lift_count), ', ') AS lifts
+
+FROM ski_resort sr
+LEFT JOIN lifts tl ON sr.id = tl.resort_id
+GROUP BY sr.id, sr.name, sr.trail_length, sr.changes, sr.max_height
+ORDER BY sr.name;
+    """)
+    return [
+        {
+            "id": row[0],
+            "name": row[1],
+            "total_km": row[2],
+            "min_height": row[3] or 0,
+            "max_height": row[4],
+            "green": row[5],
+            "blue": row[6],
+            "red": row[7],
+            "black": row[8],
+            "lifts": row[9] or "нет данных"
+        }
+        for row in cursor.fetchall()
+    ]
+
+
+def _load_details(cursor):
+    cursor.execute("""
+        SELECT
+            sr.id, sr.name, sr.information, sr.trail_length, sr.changes, sr.max_height, sr.season,
+            STRING_AGG(tl.lift_type || ': ' || tl.lift_count, ', ') AS lifts,
+            rei.how_to_get_there, rei.nearby_cities, rei.related_ski_areas
+        FROM ski_resort sr
+        LEFT JOIN lifts tl ON sr.id = tl.resort_id
+        LEFT JOIN resort_extra_info rei ON sr.id = rei.resort_id
+        GROUP BY sr.id, rei.how_to_get_there, rei.nearby_cities, rei.related_ski_areas
+    """)
+    return {
+        row[0]: {
+            "id": row[0],
+            "name": row[1],
+            "information": row[2],
+            "trail_length": row[3],
+            "changes": row[4],
+            "max_height": row[5],
+            "season": row[6],
+            "lifts": row[7] or "нет данных",
+            "how_to_get_there": row[8],
+            "nearby_cities": row[9],
+            "related_ski_areas": row[10]
+        }
+        for row in cursor.fetchall()
+    }
+
+
+def _load_features(cursor):
+    cursor.execute(f"""
+        SELECT resort_id, {", ".join(FEATURE_COLUMNS)}
+        FROM resort_features
+    """)
+    return {row[0]: dict(zip(FEATURE_COLUMNS, row[1:])) for row in cursor.fetchall()}
+
+
+def _load_selector(cursor):
+    # Подъёмники и трассы — из материализованного представления,
+    # отзывы — из сводки resort_review_rollup, которую ведёт модерация
+    cursor.execute(f"""
+        SELECT
+            sr.id,
+            sr.name,
+            sr.country,
+            sr.trail_length,
+            sr.changes,
+            sr.max_height,
+            COALESCE(sp.price_day, 0),
+            COALESCE(st.lift_info, ''),
+            COALESCE(ro.num_reviews, 0),
+            COALESCE({average_rating_sql("ro")}, 0),
+            lr.overall_comment,
+            COALESCE(st.trail_green, 0),
+            COALESCE(st.trail_blue, 0),
+            COALESCE(st.trail_red, 0),
+            COALESCE(st.trail_black, 0),
+            rwth.snow_last_3_days,
+            rwth.snow_expected,
+            sr.visa
+        FROM ski_resort sr
+        LEFT JOIN ski_pass sp ON sr.id = sp.resort_id
+        LEFT JOIN resort_selector_stats st ON sr.id = st.resort_id
+        LEFT JOIN resort_review_rollup ro ON sr.id = ro.resort_id
+        LEFT JOIN resort_reviews lr ON lr.id = ro.latest_review_id
+        LEFT JOIN resort_weather rwth ON sr.id = rwth.resort_id
+    """)
+
+    rows = []
+    filters = {}
+    for row in cursor.fetchall():
+        rows.append({
+            "id": row[0],
+            "name": row[1],
+            "country": row[2],
+            "trail_length": row[3],
+            "changes": row[4],
+            "max_height": row[5],
+            "price_day": row[6],
+            "lifts": row[7],
+            "num_reviews": row[8],
+            "average_rating": row[9],
+            "latest_review": row[10],
+            "trail_green": float(row[11]),
+            "trail_blue": float(row[12]),
+            "trail_red": float(row[13]),
+            "trail_black": float(row[14]),
+        })
+        filters[row[0]] = {
+            "snow_last_3_days": row[15],
+            "snow_expected": row[16],
+            "visa": row[17]
+        }
+    return rows, filters
+
+
+def _load_ratings(cursor):
+    cursor.execute(f"""
+        SELECT ro.resort_id, ro.num_reviews, {average_rating_sql("ro")},
+               {", ".join(f"ROUND(ro.sum_{field}::numeric / NULLIF(ro.num_reviews, 0), 1)" for field in RATING_FIELDS)}
+        FROM resort_review_rollup ro
+    """)
+    return {
+        row[0]: {
+            "num_reviews": row[1],
+            "average_rating": float(row[2] or 0),
+            "ratings": {
+                field: float(value) if value is not None else None
+                for field, value in zip(RATING_FIELDS, row[3:])
+            }
+        }
+        for row in cursor.fetchall()
+    }
+
+
+def _load_snow_forecast(cursor):
+    cursor.execute("""
+        SELECT resort_id, snowfall_start, snowfall, updated_at
+        FROM resort_weather
+        WHERE snowfall_start IS NOT NULL
+    """)
+    return {
+        row[0]: {
+            "resort_id": row[0],
+            "start": row[1],
+            "snowfall": row[2] or [],
+            "updated_at": row[3]
+        }
+        for row in cursor.fetchall()
+    }
+
+
+def _load_weather_mark(cursor):
+    cursor.execute("SELECT MAX(updated_at) FROM resort_weather")
+    return cursor.fetchone()[0]
+
+
+class ResortCatalog:
+    # Снимок редко меняющихся данных о курортах в памяти процесса.
+    # Новый снимок собирается целиком и подменяет старый одной операцией присваивания,
+    # поэтому читатели никогда не видят наполовину обновлённые данные
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self._version = 0
+        self._dirty = False
+        self._weather_updated_at = None
+        self._lock = threading.Lock()
+
+    def get(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._rebuild_locked()
+                return self._snapshot
+
+        # Страховка для изменений из других процессов: устаревший снимок
+        # отдаём сразу, а новый собираем в фоне
+        if time.monotonic() - self._loaded_at > self.max_age and self._lock.acquire(blocking=False):
+            threading.Thread(target=self._rebuild_and_release, daemon=True).start()
+        return snapshot
+
+    def rebuild(self) -> CatalogSnapshot:
+        with self._lock:
+            self._dirty = False
+            snapshot = self._rebuild_locked()
+        self._start_pending()
+        return snapshot
+
+    def schedule_rebuild(self):
+        # Пересборка в фоне после изменения данных: запрос её не ждёт,
+        # а изменения, пришедшие во время сборки, сливаются в одну следующую
+        self._dirty = True
+        self._start_pending()
+
+    def check_weather(self):
+        # Погоду обновляет только воркер-лидер (см. app/main.py); остальные воркеры
+        # раз в CATALOG_WEATHER_CHECK_INTERVAL сверяют отметку и пересобирают снимок в фоне
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            weather_updated_at = _load_weather_mark(cursor)
+            cursor.close()
+        if weather_updated_at != self._weather_updated_at:
+            self.schedule_rebuild()
+
+    def _start_pending(self):
+        if self._dirty and self._lock.acquire(blocking=False):
+            threading.Thread(target=self._rebuild_and_release, daemon=True).start()
+
+    def _rebuild_and_release(self):
+        try:
+            self._dirty = False
+            self._rebuild_locked()
+        except Exception as e:
+            print(f"[resort_catalog] Ошибка обновления снимка: {e}")
+        finally:
+            self._lock.release()
+        self._start_pending()
+
+    def _rebuild_locked(self):
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            # Отметку читаем первой: погода, записанная во время сборки, вызовет ещё одну
+            weather_updated_at = _load_weather_mark(cursor)
+            resorts = _load_resorts(cursor)
+            table = _load_table(cursor)
+            details = _load_details(cursor)
+            ratings = _load_ratings(cursor)
+            features = _load_features(cursor)
+            selector, selector_filters = _load_selector(cursor)
+            snow_forecast = _load_snow_forecast(cursor)
+            cursor.close()
+
+        empty_ratings = {"num_reviews": 0, "average_rating": 0.0, "ratings": dict.fromkeys(RATING_FIELDS)}
+        for resort_id, resort in details.items():
+            resort.update(ratings.get(resort_id, empty_ratings))
+
+        self._version += 1
+        snapshot = CatalogSnapshot(
+            version=self._version,
+            built_at=datetime.utcnow(),
+            resorts=resorts,
+            table=table,
+            details=details,
+            features=features,
+            selector=selector,
+            selector_index=ResortIndex(selector, selector_filters, features, snow_forecast),
+            snow_forecast=snow_forecast
+        )
+        self._snapshot = snapshot
+        self._loaded_at = time.monotonic()
+        self._weather_updated_at = weather_updated_at
+        return snapshot
+
+
+resort_catalog = ResortCatalog(max_age=RESORT_CATALOG_MAX_AGE)
+
+
+REFRESH_SELECTOR_STATS_SQL = "REFRESH MATERIALIZED VIEW CONCURRENTLY resort_selector_stats"
+
+
+def refresh_selector_stats(cursor):
+    # Вызывается в транзакции, изменившей трассы или подъёмники; после commit нужен resort_catalog.rebuild()
+    cursor.execute(REFRESH_SELECTOR_STATS_SQL)
+
+
+def set_catalog_headers(response, snapshot: CatalogSnapshot):
+    response.headers["X-Catalog-Version"] = str(snapshot.version)
+    response.headers["X-Catalog-Built-At"] = snapshot.built_at.isoformat()
@@ -1,24 +1,19 @@
-from fastapi import APIRouter, HTTPException
-import os
-from pathlib import Path
+from fastapi import APIRouter, HTTPException, Query
+from .gallery_index import gallery_index
+from .image_variants import SIZES
 
 router = APIRouter()
 
 @router.get("/api/resort-images/{resort_id}")
-def get_resort_images(resort_id: int):
-    base_path = Path(__file__).resolve().parent.parent
-    images_dir = base_path / "app" / "static" / "images" / "resorts" / str(resort_id)
+def get_resort_images(resort_id: int, size: str = Query("original")):
+    if size not in SIZES:
+        raise HTTPException(status_code=400, detail="Invalid size")
 
-    if not images_dir.exists() or not images_dir.is_dir():
+    images = gallery_index.get(("images", "resorts", resort_id))
+    if images is None:
         raise HTTPException(status_code=404, detail="Images not found")
 
-    images = []
-    for i, file in enumerate(sorted(images_dir.iterdir())):
-        if file.suffix.lower() in [".jpg", ".jpeg", ".png", ".webp"]:
-            static_path = file.relative_to(base_path / "app" / "static")
-            images.append({
-                "id": i + 1,
-                "image": f"/static/{static_path.as_posix()}"
-            })
-
-    return images
+    if size == "original":
+        return images
+    # Нужный размер в поле image; пока производной нет — оригинал
+    return [{**image, "image": image["variants"].get(size, image["image"])} for image in images]
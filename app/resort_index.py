@@ -0,0 +1,170 @@
+# app/resort_index.py
+
+from bisect import bisect_left, bisect_right
+
+SLOPE_FIELDS = {
+    "Зелёная": "trail_green",
+    "Синяя": "trail_blue",
+    "Красная": "trail_red",
+    "Чёрная": "trail_black",
+}
+
+# Булевы флаги из resort_features (поля *_count — числа, в фасеты не входят)
+FEATURE_FLAGS = [
+    "panoramic_trails_above_2500m", "guaranteed_snow", "snowboard_friendly",
+    "night_skiing", "kiting_available", "artificial_snow", "forest_trails",
+    "glacier_available", "summer_skiing", "freeride_opportunities",
+    "official_freeride_zones", "backcountry_routes", "heliski_available",
+    "official_freeride_guides", "kids_ski_schools"
+]
+
+# Числовые поля строки селектора, по которым можно фильтровать диапазоном
+RANGE_FIELDS = ["price_day", "max_height", "trail_length", "average_rating"]
+
+SORT_FIELDS = ["name", "price_day", "max_height", "trail_length", "average_rating", "num_reviews", "snowfall"]
+
+# Сортировка "snowfall" — по сумме прогноза снегопада на ближайшие N дней
+SNOWFALL_MAX_DAYS = 16
+
+
+def _bit_count(mask: int) -> int:
+    return bin(mask).count("1")
+
+
+class ResortIndex:
+    # Индекс строк селектора: i-й бит маски соответствует i-й строке.
+    # Булевы фасеты хранятся битовыми масками, числовые поля — отсортированными массивами
+    # с префиксными масками, так что любой диапазон превращается в маску за два bisect
+    def __init__(self, rows, flags, features, snow_forecast=None):
+        self.rows = rows
+        self.all = (1 << len(rows)) - 1
+        self._bits = {}
+        self._ranges = {}
+        self._orders = {}
+        self._snowfall = []
+        self._snowfall_orders = {}
+
+        for pos, row in enumerate(rows):
+            bit = 1 << pos
+            resort_flags = flags.get(row["id"], {})
+
+            for name in ("snow_last_3_days", "snow_expected"):
+                value = resort_flags.get(name)
+                if value is not None:
+                    self._add((name, "true" if value else "false"), bit)
+
+            visa = resort_flags.get("visa")
+            if visa is not None:
+                self._add(("visa", "yes" if visa else "no"), bit)
+
+            for colour, field in SLOPE_FIELDS.items():
+                if row[field] > 0:
+                    self._add(("slopes", colour), bit)
+
+            resort_features = features.get(row["id"], {})
+            for flag in FEATURE_FLAGS:
+                if resort_features.get(flag):
+                    self._add(("features", flag), bit)
+
+        for field in RANGE_FIELDS:
+            entries = sorted(
+                (float(row[field]), pos) for pos, row in enumerate(rows) if row[field] is not None
+            )
+            prefix = [0]
+            for _, pos in entries:
+                prefix.append(prefix[-1] | (1 << pos))
+            self._ranges[field] = ([value for value, _ in entries], prefix)
+
+        # Префиксные суммы ряда снегопада: сумма за любое окно дней — одно вычитание
+        for row in rows:
+            forecast = (snow_forecast or {}).get(row["id"])
+            if forecast is None:
+                self._snowfall.append(None)
+                continue
+            prefix = [0.0]
+            for value in forecast["snowfall"]:
+                prefix.append(prefix[-1] + (value or 0.0))
+            self._snowfall.append((forecast["start"], prefix))
+
+        for field in SORT_FIELDS:
+            if field == "snowfall":
+                continue
+            present = [pos for pos, row in enumerate(rows) if row[field] is not None]
+            missing = [pos for pos, row in enumerate(rows) if row[field] is None]
+            ascending = sorted(present, key=lambda pos: rows[pos][field])
+            # Строки без значения всегда в конце, в любом направлении сортировки
+            self._orders[(field, False)] = ascending + missing
+            self._orders[(field, True)] = ascending[::-1] + missing
+
+    def _add(self, key, bit):
+        self._bits[key] = self._bits.get(key, 0) | bit
+
+    def has_facet(self, group, value) -> bool:
+        return (group, value) in self._bits or (group == "features" and value in FEATURE_FLAGS)
+
+    def match(self, facets=(), ranges=None) -> int:
+        # facets — пары (группа, значение), все должны выполняться;
+        # ranges — {поле: (min, max)}, любая граница может быть None
+        mask = self.all
+        for key in facets:
+            mask &= self._bits.get(key, 0)
+            if not mask:
+                return 0
+        for field, (low, high) in (ranges or {}).items():
+            mask &= self._range_mask(field, low, high)
+        return mask
+
+    def _range_mask(self, field, low, high) -> int:
+        values, prefix = self._ranges[field]
+        start = bisect_left(values, low) if low is not None else 0
+        end = bisect_right(values, high) if high is not None else len(values)
+        if end <= start:
+            return 0
+        return prefix[end] ^ prefix[start]
+
+    def rows_for(self, mask, sort=None, descending=False, snow_days=None, today=None) -> list:
+        if sort == "snowfall":
+            return self._rows_by_snowfall(mask, snow_days, today, descending)
+        positions = self._orders[(sort, descending)] if sort else range(len(self.rows))
+        return [self.rows[pos] for pos in positions if mask >> pos & 1]
+
+    def snowfall_total(self, pos, days, today):
+        # Сумма снегопада за days дней, начиная с today; None, если прогноза на эти дни нет
+        entry = self._snowfall[pos]
+        if entry is None:
+            return None
+        start, prefix = entry
+        offset = max((today - start).days, 0)
+        end = min(offset + days, len(prefix) - 1)
+        if end <= offset:
+            return None
+        return round(prefix[end] - prefix[offset], 1)
+
+    def _rows_by_snowfall(self, mask, days, today, descending):
+        # Порядок зависит от окна и текущей даты, поэтому считается лениво и запоминается
+        key = (days, today, descending)
+        order = self._snowfall_orders.get(key)
+        if order is None:
+            totals = [self.snowfall_total(pos, days, today) for pos in range(len(self.rows))]
+            present = sorted(
+                (pos for pos, total in enumerate(totals) if total is not None),
+                key=lambda pos: totals[pos],
+                reverse=descending
+            )
+            missing = [pos for pos, total in enumerate(totals) if total is None]
+            order = [(pos, totals[pos]) for pos in present + missing]
+            self._snowfall_orders[key] = order
+        return [
+            {**self.rows[pos], "expected_snowfall": total}
+            for pos, total in order if mask >> pos & 1
+        ]
+
+    def count(self, mask) -> int:
+        return _bit_count(mask)
+
+    def facet_counts(self, mask) -> dict:
+        # Сколько курортов останется, если добавить фасет к текущим фильтрам
+        counts = {}
+        for (group, value), bits in self._bits.items():
+            counts.setdefault(group, {})[value] = _bit_count(mask & bits)
+        return counts
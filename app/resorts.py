@@ -1,23 +1,21 @@
 # app/resorts.py
-from fastapi import APIRouter
-from .db import get_db_connection
+from fastapi import APIRouter, Response
+from .resort_catalog import resort_catalog, set_catalog_headers
 
 router = APIRouter()
 
 @router.get("/api/resorts")
-def get_resorts():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT sr.id, sr.name, cr.latitude, cr.longitude
-        FROM ski_resort sr
-        JOIN coordinates_resort cr ON sr.id = cr.resort_id
-    """)
-    resorts = cursor.fetchall()
-    cursor.close()
-    conn.close()
+def get_resorts(response: Response):
+    snapshot = resort_catalog.get()
+    set_catalog_headers(response, snapshot)
+    return snapshot.resorts
 
-    return [
-        {"id": r[0], "name": r[1], "latitude": r[2], "longitude": r[3]}
-        for r in resorts
-    ]
+
+@router.get("/api/resort-catalog")
+def get_resort_catalog_status():
+    snapshot = resort_catalog.get()
+    return {
+        "version": snapshot.version,
+        "built_at": snapshot.built_at.isoformat(),
+        "resorts_count": len(snapshot.details)
+    }
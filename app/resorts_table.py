@@ -1,56 +1,11 @@
 # app/resorts_table.py
-from fastapi import APIRouter
-from .db import get_db_connection
+from fastapi import APIRouter, Response
+from .resort_catalog import resort_catalog, set_catalog_headers
 
 router = APIRouter()
 
 @router.get("/api/resorts-table")
-def get_resorts_table():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-SELECT
-    sr.id,
-    sr.name,
-    sr.trail_length,
-    sr.changes,
-    sr.max_height,
-
-    -- Длина зелёной трассы
-    (SELECT t.trail_length FROM tracks t WHERE t.resort_id = sr.id AND t.trail_type = 'Зелёная' LIMIT 7) AS green,
-    -- Длина синей трассы
-    (SELECT t.trail_length FROM tracks t WHERE t.resort_id = sr.id AND t.trail_type = 'Синяя' LIMIT 7) AS blue,
-    -- Длина красной трассы
-    (SELECT t.trail_length FROM tracks t WHERE t.resort_id = sr.id AND t.trail_type = 'Красная' LIMIT 7) AS red,
-    -- Длина чёрной трассы
-    (SELECT t.trail_length FROM tracks t WHERE t.resort_id = sr.id AND t.trail_type = 'Чёрная' LIMIT 7) AS black,
-
-    -- Подъёмники
-    STRING_AGG(CONCAT(tl.lift_type, ': ', tl.lift_count), ', ') AS lifts
-
-FROM ski_resort sr
-LEFT JOIN lifts tl ON sr.id = tl.resort_id
-GROUP BY sr.id, sr.name, sr.trail_length, sr.changes, sr.max_height
-ORDER BY sr.name;
-
-    """)
-    resorts = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    return [
-        {
-            "id": row[0],
-            "name": row[1],
-            "total_km": row[2],
-            "min_height": row[3] or 0,
-            "max_height": row[4],
-            "green": row[5],
-            "blue": row[6],
-            "red": row[7],
-            "black": row[8],
-            "lifts": row[9] or "нет данных"
-        }
-        for row in resorts
-    ]
+def get_resorts_table(response: Response):
+    snapshot = resort_catalog.get()
+    set_catalog_headers(response, snapshot)
+    return snapshot.table
@@ -0,0 +1,133 @@
+# app/review_rollups.py
+#
+# Сводка одобренных отзывов по курортам: число отзывов, суммы оценок по семи
+# категориям и последний отзыв. Обновляется инкрементально при модерации.
+# Проверка и пересборка: python -m app.review_rollups [--rebuild]
+
+import argparse
+
+from app.db import get_db_connection, close_pool
+
+RATING_FIELDS = [
+    "skiing", "lifts", "prices", "snow_weather",
+    "accommodation", "people", "apres_ski"
+]
+
+# Сводка, посчитанная заново по resort_reviews; используется для заполнения,
+# проверки и пересборки таблицы resort_review_rollup
+ROLLUP_AGGREGATE_SQL = f"""
+    SELECT
+        r.resort_id,
+        COUNT(*) AS num_reviews,
+        {", ".join(f"SUM(COALESCE(r.rating_{field}, 0)) AS sum_{field}" for field in RATING_FIELDS)},
+        (ARRAY_AGG(r.id ORDER BY r.created_at DESC, r.id DESC))[1] AS latest_review_id
+    FROM resort_reviews r
+    WHERE r.status = 'approve'
+    GROUP BY r.resort_id
+"""
+
+ROLLUP_COLUMNS = ["resort_id", "num_reviews", *(f"sum_{field}" for field in RATING_FIELDS), "latest_review_id"]
+
+
+def average_rating_sql(alias):
+    # Средняя оценка курорта из сумм сводки: то же, что AVG по средним оценкам отзывов
+    total = " + ".join(f"{alias}.sum_{field}" for field in RATING_FIELDS)
+    return f"ROUND(({total})::numeric / NULLIF(7 * {alias}.num_reviews, 0), 1)"
+
+
+def apply_review_status(cursor, review_id, status):
+    # Меняет статус отзыва и сдвигает сводку курорта на разницу; вызывается в транзакции модерации.
+    # Возвращает resort_id или None, если отзыва нет
+    cursor.execute(f"""
+        WITH old AS (
+            SELECT id, status FROM resort_reviews WHERE id = %s FOR UPDATE
+        )
+        UPDATE resort_reviews r
+        SET status = %s
+        FROM old
+        WHERE r.id = old.id
+        RETURNING old.status, r.resort_id,
+                  {", ".join(f"COALESCE(r.rating_{field}, 0)" for field in RATING_FIELDS)}
+    """, (review_id, status))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+
+    old_status, resort_id, ratings = row[0], row[1], row[2:]
+    delta = (status == "approve") - (old_status == "approve")
+    if delta:
+        cursor.execute(f"""
+            INSERT INTO resort_review_rollup ({", ".join(ROLLUP_COLUMNS)}, updated_at)
+            VALUES (
+                %s, %s, {", ".join(["%s"] * len(RATING_FIELDS))},
+                (SELECT id FROM resort_reviews
+                 WHERE resort_id = %s AND status = 'approve'
+                 ORDER BY created_at DESC, id DESC
+                 LIMIT 1),
+                now()
+            )
+            ON CONFLICT (resort_id) DO UPDATE
+            SET num_reviews = resort_review_rollup.num_reviews + EXCLUDED.num_reviews,
+                {", ".join(f"sum_{field} = resort_review_rollup.sum_{field} + EXCLUDED.sum_{field}" for field in RATING_FIELDS)},
+                latest_review_id = EXCLUDED.latest_review_id,
+                updated_at = now()
+        """, (resort_id, delta, *(value * delta for value in ratings), resort_id))
+        cursor.execute("""
+            UPDATE ski_resort
+            SET num_reviews = (SELECT num_reviews FROM resort_review_rollup WHERE resort_id = %s)
+            WHERE id = %s
+        """, (resort_id, resort_id))
+    return resort_id
+
+
+def check_rollups(cursor):
+    # Курорты, у которых сводка расходится с пересчётом по resort_reviews
+    cursor.execute(f"""
+        SELECT COALESCE(fresh.resort_id, ro.resort_id)
+        FROM ({ROLLUP_AGGREGATE_SQL}) fresh
+        FULL JOIN resort_review_rollup ro ON ro.resort_id = fresh.resort_id
+        WHERE ({", ".join(f"fresh.{column}" for column in ROLLUP_COLUMNS[1:])})
+              IS DISTINCT FROM
+              ({", ".join(f"ro.{column}" for column in ROLLUP_COLUMNS[1:])})
+          AND NOT (fresh.resort_id IS NULL AND ro.num_reviews = 0)
+        ORDER BY 1
+    """)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def rebuild_rollups(cursor):
+    cursor.execute("LOCK TABLE resort_review_rollup IN EXCLUSIVE MODE")
+    cursor.execute("DELETE FROM resort_review_rollup")
+    cursor.execute(f"""
+        INSERT INTO resort_review_rollup ({", ".join(ROLLUP_COLUMNS)}, updated_at)
+        SELECT *, now() FROM ({ROLLUP_AGGREGATE_SQL}) fresh
+    """)
+    cursor.execute("""
+        UPDATE ski_resort sr
+        SET num_reviews = COALESCE(ro.num_reviews, 0)
+        FROM ski_resort s
+        LEFT JOIN resort_review_rollup ro ON ro.resort_id = s.id
+        WHERE sr.id = s.id AND sr.num_reviews IS DISTINCT FROM COALESCE(ro.num_reviews, 0)
+    """)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка сводки отзывов по курортам")
+    parser.add_argument("--rebuild", action="store_true", help="пересобрать сводку, если есть расхождения")
+    args = parser.parse_args()
+
+    try:
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            mismatched = check_rollups(cur)
+            if not mismatched:
+                print("[✓] Сводка отзывов согласована")
+            else:
+                print(f"[!] Расхождения у курортов: {mismatched}")
+                if args.rebuild:
+                    rebuild_rollups(cur)
+                    conn.commit()
+                    print("[✓] Сводка пересобрана")
+            cur.close()
+    finally:
+        close_pool()
@@ -1,15 +1,57 @@
-from fastapi import APIRouter, HTTPException
-from .db import get_db_connection
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from .db import get_db, get_db_connection, PoolTimeoutError
+from .cache import TTLCache
+from .config import PREVIEW_REVIEWS_CACHE_TTL
+from .pagination import encode_cursor, decode_cursor, set_next_cursor
 
 router = APIRouter()
 
+REVIEWS_PAGE_SIZE = 10
+REVIEWS_PAGE_MAX_SIZE = 50
+
+# sort -> (столбец ключа, направление, разбор значения из курсора).
+# Каждому порядку соответствует индекс (resort_id, status, ключ, id)
+REVIEW_SORTS = {
+    "newest": ("r.created_at", "DESC", datetime.fromisoformat),
+    "highest": ("r.average_rating", "DESC", Decimal),
+    "lowest": ("r.average_rating", "ASC", Decimal),
+}
+
+
 @router.get("/api/resorts/{resort_id}/reviews")
-def get_reviews_by_resort(resort_id: int):
+def get_reviews_by_resort(
+    resort_id: int,
+    response: Response,
+    sort: str = Query("newest"),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(REVIEWS_PAGE_SIZE, ge=1, le=REVIEWS_PAGE_MAX_SIZE),
+    conn=Depends(get_db)
+):
+    if sort not in REVIEW_SORTS:
+        raise HTTPException(status_code=400, detail="Invalid sort")
+    column, direction, parse = REVIEW_SORTS[sort]
+
+    # Keyset-пагинация по (ключ сортировки, id): первая и любая следующая страница
+    # читаются по индексу за постоянное время
+    keyset = ""
+    params = [resort_id]
+    if cursor:
+        value, review_id = decode_cursor(cursor, 2)
+        try:
+            params.extend([parse(value), int(review_id)])
+        except (ValueError, InvalidOperation):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        keyset = f"AND ({column}, r.id) {'<' if direction == 'DESC' else '>'} (%s, %s)"
+    params.append(limit + 1)
+
     try:
-        conn = get_db_connection()
         cur = conn.cursor()
 
-        cur.execute("""
+        cur.execute(f"""
             SELECT
                 r.id,
                 r.user_id,
@@ -34,25 +76,23 @@ def get_reviews_by_resort(resort_id: int):
                 r.overall_comment,
                 r.created_at,
 
-                ROUND((
-                    COALESCE(r.rating_skiing, 0) +
-                    COALESCE(r.rating_lifts, 0) +
-                    COALESCE(r.rating_prices, 0) +
-                    COALESCE(r.rating_snow_weather, 0) +
-                    COALESCE(r.rating_accommodation, 0) +
-                    COALESCE(r.rating_people, 0) +
-                    COALESCE(r.rating_apres_ski, 0)
-                )::numeric / 7, 1) AS average_rating
+                r.average_rating
 
             FROM resort_reviews r
             JOIN users u ON r.user_id = u.id
-            WHERE r.resort_id = %s AND r.status = 'approve'
-            ORDER BY r.created_at DESC
-        """, (resort_id,))
+            WHERE r.resort_id = %s AND r.status = 'approve' {keyset}
+            ORDER BY {column} {direction}, r.id {direction}
+            LIMIT %s
+        """, params)
 
         rows = cur.fetchall()
         cur.close()
-        conn.close()
+
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            key = last[20] if sort == "newest" else last[21]
+            set_next_cursor(response, encode_cursor(key, last[0]))
 
         reviews = []
         for row in rows:
@@ -85,46 +125,57 @@ def get_reviews_by_resort(resort_id: int):
 
         return reviews
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/api/resorts/preview-reviews")
-def get_recent_reviews_preview():
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
 
-        cur.execute("""
-            SELECT
-                r.id,
-                u.username,
-                r.overall_comment,
-                r.created_at,
-                s.name AS resort_name,
-                s.country,
-                r.resort_id,
-                ROUND((
-                    COALESCE(r.rating_skiing, 0) +
-                    COALESCE(r.rating_lifts, 0) +
-                    COALESCE(r.rating_prices, 0) +
-                    COALESCE(r.rating_snow_weather, 0) +
-                    COALESCE(r.rating_accommodation, 0) +
-                    COALESCE(r.rating_people, 0) +
-                    COALESCE(r.rating_apres_ski, 0)
-                )::numeric / 7, 1) AS average_rating
-            FROM resort_reviews r
-            JOIN users u ON r.user_id = u.id
-            JOIN ski_resort s ON r.resort_id = s.id
-            WHERE r.status = 'approve'
-            ORDER BY r.created_at DESC
-            LIMIT 3
-        """)
+# Карусель последних отзывов на главной. Сбрасывается при модерации отзывов;
+# TTL — страховка для модерации на других воркерах
+_preview_reviews = TTLCache(maxsize=1, ttl=PREVIEW_REVIEWS_CACHE_TTL)
+_preview_reviews_generation = 0
 
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
 
-        return [
+def invalidate_preview_reviews():
+    global _preview_reviews_generation
+    _preview_reviews_generation += 1
+    _preview_reviews.clear()
+
+
+@router.get("/api/resorts/preview-reviews")
+def get_recent_reviews_preview():
+    cached = _preview_reviews.get("latest")
+    if cached is not None:
+        return cached
+
+    try:
+        generation = _preview_reviews_generation
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            # Частичный индекс по одобренным отзывам: три строки читаются без сортировки
+            cur.execute("""
+                SELECT
+                    r.id,
+                    u.username,
+                    r.overall_comment,
+                    r.created_at,
+                    s.name AS resort_name,
+                    s.country,
+                    r.resort_id,
+                    r.average_rating
+                FROM resort_reviews r
+                JOIN users u ON r.user_id = u.id
+                JOIN ski_resort s ON r.resort_id = s.id
+                WHERE r.status = 'approve'
+                ORDER BY r.created_at DESC, r.id DESC
+                LIMIT 3
+            """)
+
+            rows = cur.fetchall()
+            cur.close()
+
+        preview = [
             {
                 "id": row[0],
                 "username": row[1],
@@ -138,5 +189,11 @@ def get_recent_reviews_preview():
             for row in rows
         ]
 
+        if generation == _preview_reviews_generation:
+            _preview_reviews.set("latest", preview)
+        return preview
+
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,8 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from datetime import datetime
-from .db import get_db_connection
+from .db import get_db, get_async_db
 from .auth import get_current_user
+from .permissions import require_admin
+from .resort_catalog import resort_catalog
+from .review_rollups import apply_review_status
+from .reviews_cards import invalidate_preview_reviews
 router = APIRouter()
 
 class ReviewInput(BaseModel):
@@ -27,13 +31,11 @@ class ReviewInput(BaseModel):
 async def submit_review(
     resort_id: int,
     data: ReviewInput,
-    user_id: int = Depends(get_current_user)
+    user_id: int = Depends(get_current_user),
+    conn=Depends(get_async_db)
 ):
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        cur.execute("""
+        await conn.execute("""
             INSERT INTO resort_reviews (
                 resort_id, user_id, stay_month, stay_year,
                 rating_skiing, comment_skiing,
@@ -46,11 +48,11 @@ async def submit_review(
                 overall_comment, created_at, status
             )
             VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                %s, %s, %s, %s, %s, %s, %s, %s,
-                %s, %s, %s
+                $1, $2, $3, $4, $5, $6, $7, $8, $9, $10,
+                $11, $12, $13, $14, $15, $16, $17, $18,
+                $19, $20, $21
             )
-        """, (
+        """,
             resort_id, user_id, data.stay_month, data.stay_year,
             data.rating_skiing, data.comment_skiing,
             data.rating_lifts, data.comment_lifts,
@@ -60,11 +62,7 @@ async def submit_review(
             data.rating_people, data.comment_people,
             data.rating_apres_ski, data.comment_apres_ski,
             data.overall_comment, datetime.now(), "pending"
-        ))
-
-        conn.commit()
-        cur.close()
-        conn.close()
+        )
 
         return {"message": "Отзыв отправлен на модерацию"}
 
@@ -72,15 +70,9 @@ async def submit_review(
         raise HTTPException(status_code=500, detail="Ошибка сервера")
 
 @router.get("/api/reviews/pending")
-def get_pending_reviews(user_id: int = Depends(get_current_user)):
-    conn = get_db_connection()
+def get_pending_reviews(user_id: int = Depends(require_admin), conn=Depends(get_db)):
     cur = conn.cursor()
 
-    cur.execute("SELECT is_admin FROM users WHERE id = %s", (user_id,))
-    is_admin = cur.fetchone()
-    if not is_admin or not is_admin[0]:
-        raise HTTPException(status_code=403, detail="Access denied")
-
     cur.execute("""
 SELECT rr.id, u.username, r.name,
        rr.stay_month, rr.stay_year, rr.overall_comment,
@@ -100,7 +92,6 @@ ORDER BY rr.created_at DESC
     """)
     rows = cur.fetchall()
     cur.close()
-    conn.close()
 
     return [
         {
@@ -118,26 +109,22 @@ ORDER BY rr.created_at DESC
 
 
 @router.post("/api/reviews/{review_id}/{action}")
-def moderate_review(review_id: int, action: str, user_id: int = Depends(get_current_user)):
+def moderate_review(review_id: int, action: str, user_id: int = Depends(require_admin), conn=Depends(get_db)):
     if action not in ["approve", "reject"]:
         raise HTTPException(status_code=400, detail="Invalid action")
 
-    conn = get_db_connection()
     cur = conn.cursor()
 
-    cur.execute("SELECT is_admin FROM users WHERE id = %s", (user_id,))
-    is_admin = cur.fetchone()
-    if not is_admin or not is_admin[0]:
-        raise HTTPException(status_code=403, detail="Access denied")
-
-    cur.execute("""
-        UPDATE resort_reviews
-        SET status = %s
-        WHERE id = %s
-    """, (action, review_id))
+    # Статус отзыва и сводка курорта меняются в одной транзакции
+    resort_id = apply_review_status(cur, review_id, action)
+    if resort_id is None:
+        cur.close()
+        raise HTTPException(status_code=404, detail="Review not found")
 
     conn.commit()
     cur.close()
-    conn.close()
+    invalidate_preview_reviews()
+    # Рейтинг в снимке каталога обновится фоновой пересборкой: соединение запроса ещё занято
+    resort_catalog.schedule_rebuild()
 
     return {"message": f"Review {action}d successfully"}
@@ -0,0 +1,141 @@
+# app/scheduler.py
+
+import asyncio
+import random
+import threading
+import time
+
+import psycopg2
+from fastapi.concurrency import run_in_threadpool
+
+from .config import db_params, SCHEDULER_LOCK_KEY
+
+
+class LeaderLock:
+    # Лидер среди воркеров определяется сессионной advisory-блокировкой Postgres.
+    # Блокировку держит отдельное соединение вне пула: если процесс упадёт,
+    # соединение закроется, и лидерство перейдёт к другому воркеру
+    def __init__(self, key):
+        self.key = key
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self._conn is not None:
+                if self._is_alive():
+                    return True
+                self._drop()
+            conn = psycopg2.connect(**db_params)
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (self.key,))
+            acquired = cursor.fetchone()[0]
+            cursor.close()
+            if acquired:
+                self._conn = conn
+            else:
+                conn.close()
+            return acquired
+
+    def release(self):
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    cursor = self._conn.cursor()
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", (self.key,))
+                    cursor.close()
+                except psycopg2.Error:
+                    pass
+                self._drop()
+
+    def _is_alive(self) -> bool:
+        try:
+            cursor = self._conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _drop(self):
+        try:
+            self._conn.close()
+        except psycopg2.Error:
+            pass
+        self._conn = None
+
+
+class Job:
+    def __init__(self, name, func, interval, jitter, leader_only):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.leader_only = leader_only
+        self.running = False
+        self.last_run = None
+        self.last_duration = None
+        self.last_error = None
+
+    def next_delay(self) -> float:
+        # Случайный сдвиг, чтобы воркеры и задачи не просыпались одновременно
+        return self.interval + random.uniform(0, self.interval * self.jitter)
+
+
+class Scheduler:
+    # Периодические задачи в фоне event loop. Сами задачи синхронные и выполняются
+    # в пуле потоков, поэтому обработку запросов не блокируют
+    def __init__(self, leader_lock):
+        self.leader_lock = leader_lock
+        self.jobs = {}
+        self._tasks = []
+
+    def add_job(self, name, func, interval, jitter=0.1, leader_only=True):
+        # leader_only=False — для задач над состоянием самого процесса (например, сброс счётчиков)
+        self.jobs[name] = Job(name, func, interval, jitter, leader_only)
+
+    def start(self):
+        for job in self.jobs.values():
+            self._tasks.append(asyncio.create_task(self._loop(job)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await run_in_threadpool(self.leader_lock.release)
+
+    async def _loop(self, job):
+        # Первый запуск — вскоре после старта, со случайной задержкой
+        await asyncio.sleep(random.uniform(0, job.interval * job.jitter))
+        while True:
+            await self.run_job(job)
+            await asyncio.sleep(job.next_delay())
+
+    async def run_job(self, job) -> bool:
+        # Пропускаем запуск, если предыдущий ещё идёт или лидер — другой воркер
+        if job.running:
+            return False
+        job.running = True
+        try:
+            if job.leader_only and not await run_in_threadpool(self.leader_lock.acquire):
+                return False
+            started = time.monotonic()
+            try:
+                await run_in_threadpool(job.func)
+                job.last_error = None
+            except Exception as e:
+                job.last_error = str(e)
+                print(f"[scheduler] Ошибка задачи {job.name}: {e}")
+            job.last_run = time.time()
+            job.last_duration = time.monotonic() - started
+            return True
+        except Exception as e:
+            print(f"[scheduler] Не удалось получить блокировку лидера: {e}")
+            return False
+        finally:
+            job.running = False
+
+
+scheduler = Scheduler(LeaderLock(SCHEDULER_LOCK_KEY))
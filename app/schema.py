@@ -0,0 +1,239 @@
+# app/schema.py
+
+from .config import SCHEMA_LOCK_KEY
+from .db import get_db_connection
+from .review_rollups import ROLLUP_AGGREGATE_SQL, ROLLUP_COLUMNS
+
+# Объекты БД, которые нужны приложению поверх базовой схемы.
+# Все операторы идемпотентны и выполняются при старте приложения под advisory-блокировкой,
+# чтобы воркеры не применяли DDL одновременно
+SCHEMA_STATEMENTS = [
+    # Суточный прогноз снегопада (см) из последнего запроса к Open-Meteo:
+    # snowfall[i] относится к дню snowfall_start + i
+    "ALTER TABLE resort_weather ADD COLUMN IF NOT EXISTS snowfall_start date",
+    "ALTER TABLE resort_weather ADD COLUMN IF NOT EXISTS snowfall real[]",
+    # Лента новостей: keyset-пагинация по (publication_date, id) и пакетная загрузка тегов
+    """
+    CREATE INDEX IF NOT EXISTS articles_published_feed_idx
+    ON articles (publication_date DESC, id DESC) WHERE is_published
+    """,
+    "CREATE INDEX IF NOT EXISTS article_tag_article_id_idx ON article_tag (article_id)",
+    # Обложка статьи — первое по id изображение (ORDER BY id LIMIT 1 по индексу)
+    "CREATE INDEX IF NOT EXISTS article_images_article_id_idx ON article_images (article_id, id)",
+    # Фильтр ленты по тегу и облако тегов; поиск тега по имени — уникальный индекс из MIGRATIONS
+    "CREATE INDEX IF NOT EXISTS article_tag_tag_id_idx ON article_tag (tag_id, article_id)",
+    # Полнотекстовый поиск по статьям (см. /api/news/search): заголовок, текст и теги
+    # с русской морфологией. Вектор пересчитывает триггер при изменении статьи или её тегов
+    "ALTER TABLE articles ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """
+    CREATE OR REPLACE FUNCTION articles_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', COALESCE(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('russian', COALESCE((
+                SELECT string_agg(t.name, ' ')
+                FROM article_tag at
+                JOIN tag t ON t.id = at.tag_id
+                WHERE at.article_id = NEW.id
+            ), '')), 'B') ||
+            setweight(to_tsvector('russian', COALESCE(NEW.content, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION article_tag_search_vector_touch() RETURNS trigger AS $$
+    BEGIN
+        -- Обновление search_vector запускает пересчёт в триггере articles
+        UPDATE articles SET search_vector = NULL
+        WHERE id = CASE WHEN TG_OP = 'DELETE' THEN OLD.article_id ELSE NEW.article_id END;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'articles_search_vector_trg') THEN
+            -- Только при изменении текста: голосование (UPDATE rating) вектор не трогает
+            CREATE TRIGGER articles_search_vector_trg
+            BEFORE INSERT OR UPDATE OF title, content, search_vector ON articles
+            FOR EACH ROW EXECUTE FUNCTION articles_search_vector_update();
+        END IF;
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'article_tag_search_vector_trg') THEN
+            CREATE TRIGGER article_tag_search_vector_trg
+            AFTER INSERT OR DELETE ON article_tag
+            FOR EACH ROW EXECUTE FUNCTION article_tag_search_vector_touch();
+        END IF;
+    END
+    $$
+    """,
+    # Заполнение для статей, созданных до появления триггера
+    "UPDATE articles SET search_vector = NULL WHERE search_vector IS NULL",
+    "CREATE INDEX IF NOT EXISTS articles_search_vector_idx ON articles USING GIN (search_vector)",
+    # Средняя оценка отзыва хранится в строке и пересчитывается самим Postgres при записи
+    """
+    ALTER TABLE resort_reviews ADD COLUMN IF NOT EXISTS average_rating numeric
+    GENERATED ALWAYS AS (ROUND((
+        COALESCE(rating_skiing, 0) +
+        COALESCE(rating_lifts, 0) +
+        COALESCE(rating_prices, 0) +
+        COALESCE(rating_snow_weather, 0) +
+        COALESCE(rating_accommodation, 0) +
+        COALESCE(rating_people, 0) +
+        COALESCE(rating_apres_ski, 0)
+    )::numeric / 7, 1)) STORED
+    """,
+    # Страницы отзывов курорта: новые, лучшие и худшие (см. app/reviews_cards.py)
+    """
+    CREATE INDEX IF NOT EXISTS resort_reviews_resort_status_created_idx
+    ON resort_reviews (resort_id, status, created_at DESC, id DESC)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS resort_reviews_resort_status_rating_idx
+    ON resort_reviews (resort_id, status, average_rating, id)
+    """,
+    # Последние одобренные отзывы для карусели на главной (см. /api/resorts/preview-reviews)
+    """
+    CREATE INDEX IF NOT EXISTS resort_reviews_approved_recent_idx
+    ON resort_reviews (created_at DESC, id DESC) WHERE status = 'approve'
+    """,
+    # Обзоры блогеров: страницы по статусу и изображения к ним (см. app/bloggers.py)
+    """
+    CREATE INDEX IF NOT EXISTS blogger_reviews_status_created_idx
+    ON blogger_reviews (status, created_at DESC, id DESC)
+    """,
+    "CREATE INDEX IF NOT EXISTS blogger_review_images_review_id_idx ON blogger_review_images (review_id)",
+    # Сводка одобренных отзывов по курортам (см. app/review_rollups.py)
+    """
+    CREATE TABLE IF NOT EXISTS resort_review_rollup (
+        resort_id integer PRIMARY KEY,
+        num_reviews integer NOT NULL DEFAULT 0,
+        sum_skiing bigint NOT NULL DEFAULT 0,
+        sum_lifts bigint NOT NULL DEFAULT 0,
+        sum_prices bigint NOT NULL DEFAULT 0,
+        sum_snow_weather bigint NOT NULL DEFAULT 0,
+        sum_accommodation bigint NOT NULL DEFAULT 0,
+        sum_people bigint NOT NULL DEFAULT 0,
+        sum_apres_ski bigint NOT NULL DEFAULT 0,
+        latest_review_id integer,
+        updated_at timestamp NOT NULL DEFAULT now()
+    )
+    """,
+    # Разовые миграции, уже применённые к базе (см. MIGRATIONS)
+    """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        name text PRIMARY KEY,
+        applied_at timestamp NOT NULL DEFAULT now()
+    )
+    """,
+]
+
+# Разовые преобразования данных: выполняются один раз за жизнь базы, после SCHEMA_STATEMENTS,
+# и отмечаются в schema_migrations в той же транзакции
+MIGRATIONS = [
+    # Один голос пользователя за статью: сначала убираем накопившиеся дубли, затем индекс
+    ("article_votes_unique", [
+        """
+        DELETE FROM article_votes a
+        USING article_votes b
+        WHERE a.user_id = b.user_id AND a.article_id = b.article_id AND a.ctid > b.ctid
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS article_votes_user_article_idx ON article_votes (user_id, article_id)",
+    ]),
+    # Первичное заполнение сводки отзывов; дальше её ведёт модерация,
+    # а расхождения ищет python -m app.review_rollups
+    ("resort_review_rollup_backfill", [
+        f"""
+        INSERT INTO resort_review_rollup ({", ".join(ROLLUP_COLUMNS)}, updated_at)
+        SELECT *, now() FROM ({ROLLUP_AGGREGATE_SQL}) fresh
+        ON CONFLICT (resort_id) DO NOTHING
+        """,
+    ]),
+    # Агрегаты для селектора курортов: подъёмники и трассы по цветам. Обновляется при изменении
+    # трасс и подъёмников (см. resort_catalog.refresh_selector_stats); отзывы селектор берёт
+    # из resort_review_rollup. Чтобы изменить определение, добавьте миграцию со следующей версией
+    ("resort_selector_stats_v2", [
+        "DROP MATERIALIZED VIEW IF EXISTS resort_selector_stats",
+        """
+        CREATE MATERIALIZED VIEW resort_selector_stats AS
+        SELECT
+            sr.id AS resort_id,
+            COALESCE(lifts.lift_info, '') AS lift_info,
+            COALESCE(trails.trail_green, 0) AS trail_green,
+            COALESCE(trails.trail_blue, 0) AS trail_blue,
+            COALESCE(trails.trail_red, 0) AS trail_red,
+            COALESCE(trails.trail_black, 0) AS trail_black
+        FROM ski_resort sr
+        LEFT JOIN (
+            SELECT resort_id, STRING_AGG(lift_type || ' ' || lift_count, ', ') AS lift_info
+            FROM lifts
+            GROUP BY resort_id
+        ) lifts ON sr.id = lifts.resort_id
+        LEFT JOIN (
+            SELECT
+                resort_id,
+                ROUND(SUM(CASE WHEN trail_type = 'Зелёная' THEN trail_length ELSE 0 END)::numeric, 1) AS trail_green,
+                ROUND(SUM(CASE WHEN trail_type = 'Синяя' THEN trail_length ELSE 0 END)::numeric, 1) AS trail_blue,
+                ROUND(SUM(CASE WHEN trail_type = 'Красная' THEN trail_length ELSE 0 END)::numeric, 1) AS trail_red,
+                ROUND(SUM(CASE WHEN trail_type = 'Чёрная' THEN trail_length ELSE 0 END)::numeric, 1) AS trail_black
+            FROM tracks
+            GROUP BY resort_id
+        ) trails ON sr.id = trails.resort_id
+        """,
+        # Уникальный индекс нужен для REFRESH MATERIALIZED VIEW CONCURRENTLY
+        "CREATE UNIQUE INDEX resort_selector_stats_resort_id_idx ON resort_selector_stats (resort_id)",
+    ]),
+    # Один тег на имя: связи с дублями переводим на тег с наименьшим id, дубли удаляем,
+    # затем уникальный индекс для INSERT ... ON CONFLICT (name) при создании статьи
+    ("tag_name_unique", [
+        """
+        CREATE TEMP TABLE tag_duplicates ON COMMIT DROP AS
+        SELECT id, keep_id
+        FROM (SELECT id, MIN(id) OVER (PARTITION BY name) AS keep_id FROM tag) t
+        WHERE id <> keep_id
+        """,
+        """
+        INSERT INTO article_tag (article_id, tag_id)
+        SELECT DISTINCT at.article_id, d.keep_id
+        FROM article_tag at
+        JOIN tag_duplicates d ON d.id = at.tag_id
+        WHERE NOT EXISTS (
+            SELECT 1 FROM article_tag x
+            WHERE x.article_id = at.article_id AND x.tag_id = d.keep_id
+        )
+        """,
+        "DELETE FROM article_tag at USING tag_duplicates d WHERE at.tag_id = d.id",
+        "DELETE FROM tag t USING tag_duplicates d WHERE t.id = d.id",
+        "DROP INDEX IF EXISTS tag_name_idx",
+        "CREATE UNIQUE INDEX tag_name_key ON tag (name)",
+    ]),
+]
+
+
+def ensure_schema():
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        # Сессионная блокировка: остальные воркеры ждут, пока первый применит схему
+        cursor.execute("SELECT pg_advisory_lock(%s)", (SCHEMA_LOCK_KEY,))
+        try:
+            for statement in SCHEMA_STATEMENTS:
+                cursor.execute(statement)
+            conn.commit()
+
+            cursor.execute("SELECT name FROM schema_migrations")
+            applied = {row[0] for row in cursor.fetchall()}
+            for name, statements in MIGRATIONS:
+                if name in applied:
+                    continue
+                for statement in statements:
+                    cursor.execute(statement)
+                cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (SCHEMA_LOCK_KEY,))
+            conn.commit()
+            cursor.close()
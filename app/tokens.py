@@ -0,0 +1,52 @@
+# app/tokens.py
+
+from fastapi import Header, HTTPException, Request
+from jose import jwt, JWTError
+
+from .cache import TTLCache
+from .config import SECRET_KEY, ALGORITHM, TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL
+
+# Кэш уже проверенных токенов: подпись проверяется один раз, а не на каждом запросе.
+# Запись никогда не живёт дольше exp самого токена
+_verified_tokens = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+
+
+def decode_token(token: str):
+    # Бросает JWTError, если токен неверный или просрочен.
+    # None — если подпись верна, но sub не числовой id пользователя
+    claims = _verified_tokens.get(token)
+    if claims is not None:
+        return claims
+
+    claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    try:
+        int(claims.get("sub"))
+    except (TypeError, ValueError):
+        return None
+    exp = claims.get("exp")
+    if exp is not None:
+        _verified_tokens.set(token, claims, expires_at=exp)
+    return claims
+
+
+def decode_access_token(token: str):
+    try:
+        payload = decode_token(token)
+    except JWTError:
+        return None
+    if payload is None:
+        return None
+    return int(payload["sub"])
+
+
+def get_current_user(request: Request, Authorization: str = Header(...)):
+    # Токен уже проверен в AuthMiddleware — повторно не декодируем
+    claims = getattr(request.state, "token_claims", None)
+    if claims is not None:
+        return int(claims["sub"])
+
+    token = Authorization.split(" ")[1]
+    user_id = decode_access_token(token)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return int(user_id)
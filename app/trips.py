@@ -2,7 +2,7 @@ from typing import List, Optional
 from pydantic import BaseModel
 from datetime import date as dt
 from fastapi import APIRouter, HTTPException, Depends, Path, Body
-from .db import get_db_connection
+from .db import get_db
 from .auth import get_current_user
 
 router = APIRouter()
@@ -22,8 +22,7 @@ class TripOut(BaseModel):
     description: Optional[str]
 
 @router.get("/api/trips", response_model=List[TripOut])
-def get_user_trips(user_id: int = Depends(get_current_user)):
-    conn = get_db_connection()
+def get_user_trips(user_id: int = Depends(get_current_user), conn=Depends(get_db)):
     cur = conn.cursor()
     cur.execute("""
         SELECT t.id, t.resort_name, t.trip_start_date, t.trip_end_date, t.description
@@ -34,7 +33,6 @@ def get_user_trips(user_id: int = Depends(get_current_user)):
     """, (user_id,))
     rows = cur.fetchall()
     cur.close()
-    conn.close()
     return [
         {
             "id": r[0],
@@ -47,8 +45,7 @@ def get_user_trips(user_id: int = Depends(get_current_user)):
 
 
 @router.post("/api/trips", response_model=TripOut)
-def create_trip(trip: TripCreate, user_id: int = Depends(get_current_user)):
-    conn = get_db_connection()
+def create_trip(trip: TripCreate, user_id: int = Depends(get_current_user), conn=Depends(get_db)):
     cur = conn.cursor()
 
     cur.execute("""
@@ -71,7 +68,6 @@ def create_trip(trip: TripCreate, user_id: int = Depends(get_current_user)):
     row = cur.fetchone()
 
     cur.close()
-    conn.close()
     return {
         "id": row[0],
         "resort_name": row[1],
@@ -82,8 +78,7 @@ def create_trip(trip: TripCreate, user_id: int = Depends(get_current_user)):
 
 
 @router.delete("/api/trips/{trip_id}")
-def delete_trip(trip_id: int, user_id: int = Depends(get_current_user)):
-    conn = get_db_connection()
+def delete_trip(trip_id: int, user_id: int = Depends(get_current_user), conn=Depends(get_db)):
     cur = conn.cursor()
 
     cur.execute("SELECT created_by FROM trips WHERE id = %s", (trip_id,))
@@ -96,14 +91,12 @@ def delete_trip(trip_id: int, user_id: int = Depends(get_current_user)):
     cur.execute("DELETE FROM trips WHERE id = %s", (trip_id,))
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Поездка удалена"}
 
 
 @router.post("/api/trips/join_user/{trip_id}")
-def join_trip(trip_id: int, user_id: int = Depends(get_current_user)):
-    conn = get_db_connection()
+def join_trip(trip_id: int, user_id: int = Depends(get_current_user), conn=Depends(get_db)):
     cur = conn.cursor()
 
     cur.execute("SELECT trip_end_date FROM trips WHERE id = %s", (trip_id,))
@@ -121,14 +114,12 @@ def join_trip(trip_id: int, user_id: int = Depends(get_current_user)):
     cur.execute("INSERT INTO trip_participants (trip_id, user_id) VALUES (%s, %s)", (trip_id, user_id))
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Вы присоединились к поездке"}
 
 
 @router.get("/api/trips/{trip_id}/participants")
-def get_participants(trip_id: int, user_id: int = Depends(get_current_user)):
-    conn = get_db_connection()
+def get_participants(trip_id: int, user_id: int = Depends(get_current_user), conn=Depends(get_db)):
     cur = conn.cursor()
 
     cur.execute("""
@@ -144,12 +135,10 @@ def get_participants(trip_id: int, user_id: int = Depends(get_current_user)):
     ]
 
     cur.close()
-    conn.close()
     return users
 
 @router.post("/api/trips/leave/{trip_id}")
-def leave_trip(trip_id: int, user_id: int = Depends(get_current_user)):
-    conn = get_db_connection()
+def leave_trip(trip_id: int, user_id: int = Depends(get_current_user), conn=Depends(get_db)):
     cur = conn.cursor()
 
     # Проверяем, участвует ли пользователь в поездке
@@ -161,6 +150,5 @@ def leave_trip(trip_id: int, user_id: int = Depends(get_current_user)):
     cur.execute("DELETE FROM trip_participants WHERE trip_id = %s AND user_id = %s", (trip_id, user_id))
     conn.commit()
     cur.close()
-    conn.close()
 
     return {"message": "Вы покинули поездку"}
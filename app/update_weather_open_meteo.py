@@ -1,68 +1,252 @@
+# app/update_weather_open_meteo.py
+#
+# Обновление снежной обстановки по прогнозу Open-Meteo.
+# В приложении запускается по расписанию (см. app/scheduler.py и app/main.py),
+# вручную — как скрипт.
+# Запуск: python -m app.update_weather_open_meteo [--stub] [--force] [--base-url URL] [--concurrency N]
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
 import requests
-import psycopg2
-from datetime import datetime
-
-# Настройки подключения к БД
-conn = psycopg2.connect(
-    dbname="ski_portal",
-    user="postgres",
-    password="nikita",
-    host="localhost",
-    port="5432"
+from psycopg2.extras import execute_values
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.config import (
+    WEATHER_API_URL, WEATHER_CONCURRENCY, WEATHER_RETRIES, WEATHER_TIMEOUT,
+    WEATHER_BATCH_SIZE, WEATHER_GRID_STEP, WEATHER_FRESHNESS, WEATHER_FORECAST_DAYS
 )
-cur = conn.cursor()
+from app.db import get_db_connection, close_pool
 
-# Получение координат всех курортов
-cur.execute("""
-    SELECT sr.id, cr.latitude, cr.longitude
-    FROM ski_resort sr
-    JOIN coordinates_resort cr ON sr.id = cr.resort_id
-""")
-resorts = cur.fetchall()
 
-for resort_id, latitude, longitude in resorts:
-    try:
-        response = requests.get(
-            "https://api.open-meteo.com/v1/forecast",
-            params={
-                "latitude": "latitude",
-                "longitude": "longitude",
-                "daily": "snowfall",
-                "timezone": "auto"
-            },
-            timeout=10
-        )
-        data = response.json()
+def make_session(pool_size=WEATHER_CONCURRENCY, retries=WEATHER_RETRIES):
+    # Один HTTP-клиент с пулом keep-alive соединений и повторами с экспоненциальной паузой
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"])
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def snow_series(data):
+    # Начальная дата и суточные значения снегопада; пропуски API сохраняем как NULL
+    daily = data.get("daily", {})
+    days = daily.get("time") or []
+    snow_values = daily.get("snowfall") or []
+    start = date.fromisoformat(days[0]) if days else None
+    return start, snow_values
 
-        snow_values = data.get("daily", {}).get("snowfall", [])
-        dates = data.get("daily", {}).get("time", [])
 
-        snow_last_3_days = False
-        snow_expected = False
+def snow_flags(snow_values):
+    snow_last_3_days = any(value and value > 0 for value in snow_values[:3])
+    snow_expected = any(value and value > 0 for value in snow_values[1:4])
+    return snow_last_3_days, snow_expected
 
-        for i in range(min(3, len(snow_values))):
-            if snow_values[i] and snow_values[i] > 0:
-                snow_last_3_days = True
 
-        for i in range(1, min(4, len(snow_values))):
-            if snow_values[i] and snow_values[i] > 0:
-                snow_expected = True
+def fetch_forecasts(session, base_url, points):
+    # Open-Meteo принимает списки координат через запятую и возвращает массив прогнозов
+    # в том же порядке (для одной точки — одиночный объект)
+    response = session.get(
+        base_url,
+        params={
+            "latitude": ",".join(str(latitude) for latitude, _ in points),
+            "longitude": ",".join(str(longitude) for _, longitude in points),
+            "daily": "snowfall",
+            "forecast_days": WEATHER_FORECAST_DAYS,
+            "timezone": "auto"
+        },
+        timeout=WEATHER_TIMEOUT
+    )
+    response.raise_for_status()
+    data = response.json()
+    forecasts = data if isinstance(data, list) else [data]
+    if len(forecasts) != len(points):
+        raise ValueError(f"expected {len(points)} forecasts, got {len(forecasts)}")
+    return forecasts
 
-        # Обновляем таблицу resort_weather
+
+def needs_refresh(age, snowfall_start, freshness=WEATHER_FRESHNESS):
+    # age — секунд с последнего обновления (None — погоды ещё нет).
+    # Строка-заглушка от создания курорта (без ряда снегопада) свежей не считается
+    return age is None or snowfall_start is None or age >= freshness
+
+
+def load_resort_coordinates(freshness=WEATHER_FRESHNESS):
+    # Курорты, обновлённые позже чем freshness секунд назад, пропускаем
+    with get_db_connection() as conn:
+        cur = conn.cursor()
         cur.execute("""
-            INSERT INTO resort_weather (resort_id, snow_last_3_days, snow_expected, updated_at)
-            VALUES (%s, %s, %s, now())
+            SELECT sr.id, cr.latitude, cr.longitude,
+                   EXTRACT(EPOCH FROM now() - rw.updated_at), rw.snowfall_start
+            FROM ski_resort sr
+            JOIN coordinates_resort cr ON sr.id = cr.resort_id
+            LEFT JOIN resort_weather rw ON sr.id = rw.resort_id
+        """)
+        rows = cur.fetchall()
+        cur.close()
+    resorts = [
+        (resort_id, latitude, longitude)
+        for resort_id, latitude, longitude, age, snowfall_start in rows
+        if needs_refresh(age, snowfall_start, freshness)
+    ]
+    return resorts, len(rows)
+
+
+def group_by_grid_cell(resorts, step=WEATHER_GRID_STEP):
+    # Соседние курорты в одной ячейке сетки прогноза получают один общий запрос
+    cells = {}
+    for resort_id, latitude, longitude in resorts:
+        key = (round(float(latitude) / step), round(float(longitude) / step))
+        if key not in cells:
+            cells[key] = ((float(latitude), float(longitude)), [])
+        cells[key][1].append(resort_id)
+    return list(cells.values())
+
+
+def save_weather(rows):
+    # Одна пакетная вставка вместо UPSERT на каждый курорт
+    if not rows:
+        return
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        execute_values(cur, """
+            INSERT INTO resort_weather (
+                resort_id, snow_last_3_days, snow_expected, snowfall_start, snowfall, updated_at
+            )
+            VALUES %s
             ON CONFLICT (resort_id) DO UPDATE
             SET snow_last_3_days = EXCLUDED.snow_last_3_days,
                 snow_expected = EXCLUDED.snow_expected,
+                snowfall_start = EXCLUDED.snowfall_start,
+                snowfall = EXCLUDED.snowfall,
                 updated_at = now()
-        """, (resort_id, snow_last_3_days, snow_expected))
+        """, rows, template="(%s, %s, %s, %s, %s::real[], now())", page_size=1000)
+        conn.commit()
+        cur.close()
 
-        print(f"[✓] Обновлено: курорт {resort_id}")
 
-    except Exception as e:
-        print(f"[!] Ошибка для курорта {resort_id}: {e}")
+def refresh_weather(
+    base_url=WEATHER_API_URL,
+    concurrency=WEATHER_CONCURRENCY,
+    batch_size=WEATHER_BATCH_SIZE,
+    freshness=WEATHER_FRESHNESS
+):
+    # Соединение с БД не держим, пока идут HTTP-запросы
+    resorts, total = load_resort_coordinates(freshness)
+    cells = group_by_grid_cell(resorts)
+    batches = [cells[i:i + batch_size] for i in range(0, len(cells), batch_size)]
+    session = make_session(pool_size=concurrency)
 
-conn.commit()
-cur.close()
-conn.close()
+    def fetch(batch):
+        try:
+            forecasts = fetch_forecasts(session, base_url, [point for point, _ in batch])
+        except Exception as e:
+            resort_ids = [resort_id for _, ids in batch for resort_id in ids]
+            print(f"[!] Ошибка для курортов {resort_ids}: {e}")
+            return []
+        rows = []
+        for (_, resort_ids), data in zip(batch, forecasts):
+            start, snow_values = snow_series(data)
+            flags = snow_flags(snow_values)
+            rows.extend((resort_id, *flags, start, snow_values) for resort_id in resort_ids)
+        return rows
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(fetch, batches))
+    session.close()
+
+    rows = [row for batch_rows in results for row in batch_rows]
+    save_weather(rows)
+    return {
+        "updated": len(rows),
+        "failed": len(resorts) - len(rows),
+        "skipped": total - len(resorts),
+        "requests": len(batches)
+    }
+
+
+class _StubForecastHandler(BaseHTTPRequestHandler):
+    # Локальная заглушка Open-Meteo для тестового режима: детерминированный снегопад по координатам
+    def do_GET(self):
+        with self.server.counter_lock:
+            self.server.request_count += 1
+        params = parse_qs(urlparse(self.path).query)
+        latitudes = [float(value) for value in params.get("latitude", ["0"])[0].split(",")]
+        longitudes = [float(value) for value in params.get("longitude", ["0"])[0].split(",")]
+        days = int(params.get("forecast_days", ["7"])[0])
+        today = date.today()
+        forecasts = []
+        for latitude, longitude in zip(latitudes, longitudes):
+            rng = random.Random(f"{latitude:.4f},{longitude:.4f}")
+            forecasts.append({
+                "latitude": latitude,
+                "longitude": longitude,
+                "daily": {
+                    "time": [(today + timedelta(days=i)).isoformat() for i in range(days)],
+                    "snowfall": [round(max(0.0, rng.uniform(-5, 5)), 1) for _ in range(days)]
+                }
+            })
+        body = json.dumps(forecasts if len(forecasts) > 1 else forecasts[0]).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubForecastHandler)
+    # Число принятых запросов — для проверки группировки и пакетов
+    server.request_count = 0
+    server.counter_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обновление погоды курортов из Open-Meteo")
+    parser.add_argument("--stub", action="store_true", help="использовать локальную заглушку вместо Open-Meteo")
+    parser.add_argument("--base-url", default=WEATHER_API_URL)
+    parser.add_argument("--concurrency", type=int, default=WEATHER_CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=WEATHER_BATCH_SIZE)
+    parser.add_argument("--force", action="store_true", help="обновить все курорты, игнорируя окно свежести")
+    args = parser.parse_args()
+
+    base_url = args.base_url
+    stub = None
+    if args.stub:
+        stub = start_stub_server()
+        base_url = f"http://127.0.0.1:{stub.server_address[1]}/v1/forecast"
+
+    started = time.monotonic()
+    try:
+        stats = refresh_weather(
+            base_url=base_url,
+            concurrency=args.concurrency,
+            batch_size=args.batch_size,
+            freshness=0 if args.force else WEATHER_FRESHNESS
+        )
+    finally:
+        if stub:
+            stub.shutdown()
+        close_pool()
+    print(f"[✓] Обновлено курортов: {stats['updated']}, ошибок: {stats['failed']}, "
+          f"пропущено свежих: {stats['skipped']}, HTTP-запросов: {stats['requests']}, "
+          f"за {time.monotonic() - started:.1f} с")
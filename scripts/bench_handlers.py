@@ -0,0 +1,165 @@
+# scripts/bench_handlers.py
+#
+# Задержка быстрых маршрутов, пока параллельно выполняются медленные запросы к БД.
+# Если async-обработчик вызывает psycopg2 прямо в event loop, медленный запрос задерживает
+# все остальные запросы воркера; с asyncpg он только ждёт своё соединение.
+#
+# Сервер с добавленным маршрутом /bench/slow (SELECT pg_sleep) запускается этим же скриптом.
+# Маршрут пишется так же, как обработчики проверяемого коммита: через get_async_db, если он
+# есть, иначе через get_db внутри async def. Сравнение до и после перехода на asyncpg:
+#   cp scripts/bench_handlers.py /tmp/
+#   git checkout 93bdc55^ && python /tmp/bench_handlers.py serve --port 8000   # в отдельном терминале
+#   python /tmp/bench_handlers.py load --base-url http://127.0.0.1:8000
+#   git checkout 93bdc55 и повторить; сравнить p99 быстрых маршрутов
+# Из корня репозитория: python scripts/bench_handlers.py serve|load ...
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.getcwd())
+
+DEFAULT_PATHS = ["/api/news", "/api/newsPage", "/api/resorts", "/api/blogger-reviews"]
+SLOW_PATH = "/bench/slow"
+
+
+def serve(host, port, slow_seconds):
+    import uvicorn
+    from fastapi import Depends
+
+    from app import db
+    from app.main import app
+
+    if hasattr(db, "get_async_db"):
+        async def slow(conn=Depends(db.get_async_db)):
+            await conn.fetchval("SELECT pg_sleep($1)", slow_seconds)
+            return {"slept": slow_seconds}
+    else:
+        async def slow(conn=Depends(db.get_db)):
+            cursor = conn.cursor()
+            cursor.execute("SELECT pg_sleep(%s)", (slow_seconds,))
+            cursor.close()
+            return {"slept": slow_seconds}
+
+    app.add_api_route(SLOW_PATH, slow, methods=["GET"])
+    uvicorn.run(app, host=host, port=port, workers=1, log_level="warning")
+
+
+def make_token():
+    # Маршрут /bench/slow закрыт AuthMiddleware — подписываем токен ключом приложения
+    from jose import jwt
+    from app.config import SECRET_KEY, ALGORITHM
+    return jwt.encode({"sub": "1", "exp": int(time.time()) + 3600}, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def fetch(url, token=None, timeout=30):
+    request = urllib.request.Request(url)
+    if token:
+        request.add_header("Authorization", f"Bearer {token}")
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, TimeoutError):
+        status = None
+    return status, time.perf_counter() - started
+
+
+def slow_load(url, token, concurrency, stop, statuses):
+    # Непрерывный поток медленных запросов, пока идёт замер быстрых
+    def worker():
+        while not stop.is_set():
+            statuses.append(fetch(url, token, timeout=120)[0])
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def measure(base_url, path, total, concurrency):
+    url = base_url.rstrip("/") + path
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        started = time.perf_counter()
+        results = list(executor.map(lambda _: fetch(url), range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies = [latency * 1000 for status, latency in results if status == 200]
+    errors = sum(1 for status, _ in results if status != 200)
+    if not latencies:
+        return f"{path:<28} все {total} запросов завершились ошибкой"
+    return (
+        f"{path:<28} {total / elapsed:8.1f} rps  "
+        f"p50 {percentile(latencies, 50):7.1f} мс  "
+        f"p95 {percentile(latencies, 95):7.1f} мс  "
+        f"p99 {percentile(latencies, 99):7.1f} мс  "
+        f"среднее {statistics.mean(latencies):7.1f} мс  "
+        f"ошибок {errors}"
+    )
+
+
+def load(args):
+    paths = args.paths or DEFAULT_PATHS
+    for path in paths:
+        for _ in range(args.warmup):
+            fetch(args.base_url.rstrip("/") + path)
+
+    print(f"{args.base_url}: {args.requests} запросов на маршрут, параллельно {args.concurrency}")
+    print("Без медленных запросов:")
+    for path in paths:
+        print("  " + measure(args.base_url, path, args.requests, args.concurrency))
+
+    if args.slow_concurrency:
+        stop = threading.Event()
+        statuses = []
+        threads = slow_load(
+            args.base_url.rstrip("/") + SLOW_PATH, make_token(), args.slow_concurrency, stop, statuses
+        )
+        time.sleep(0.5)
+        print(f"Параллельно {args.slow_concurrency} медленных запросов {SLOW_PATH}:")
+        for path in paths:
+            print("  " + measure(args.base_url, path, args.requests, args.concurrency))
+        stop.set()
+        for thread in threads:
+            thread.join()
+        failed = sum(1 for status in statuses if status != 200)
+        print(f"  медленных запросов: {len(statuses)}, ошибок {failed}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Задержка обработчиков под нагрузкой с медленными запросами")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="запустить приложение с маршрутом /bench/slow")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--slow-seconds", type=float, default=0.5, help="длительность pg_sleep")
+
+    load_parser = commands.add_parser("load", help="нагрузить запущенный сервер")
+    load_parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    load_parser.add_argument("--path", action="append", dest="paths", help="быстрый маршрут; можно несколько раз")
+    load_parser.add_argument("--requests", type=int, default=500, help="запросов на маршрут")
+    load_parser.add_argument("--concurrency", type=int, default=20)
+    load_parser.add_argument("--slow-concurrency", type=int, default=8, help="0 — без медленных запросов")
+    load_parser.add_argument("--warmup", type=int, default=20, help="запросов на прогрев перед замером")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.host, args.port, args.slow_seconds)
+    else:
+        load(args)
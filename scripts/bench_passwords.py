@@ -0,0 +1,94 @@
+# scripts/bench_passwords.py
+#
+# Пропускная способность входа под параллельной нагрузкой: те же шаги с паролем, что
+# в auth.login — verify_password и, если cost хэша устарел, hash_password (rehash-on-login).
+# Сравниваются проверка прямо в корутине (как было до app.passwords) и пул потоков
+# app.passwords, с актуальным и с устаревшим cost хранимого хэша.
+# Запуск из корня репозитория:
+#   python -m scripts.bench_passwords --logins 64 --concurrency 16
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import bcrypt
+
+from app import passwords
+from app.config import BCRYPT_ROUNDS, PASSWORD_HASH_CONCURRENCY
+
+PASSWORD = "correct horse battery staple"
+
+
+async def _measure_lag(stop, interval=0.01):
+    # Насколько позже запланированного просыпается корутина: столько же ждали бы другие запросы
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def login_inline(stored):
+    # Прежний вход: bcrypt блокирует event loop на всё время проверки
+    assert bcrypt.checkpw(PASSWORD.encode("utf-8"), stored.encode("utf-8"))
+
+
+async def login_pool(stored):
+    # Шаги auth.login после выборки пользователя
+    assert await passwords.verify_password(PASSWORD, stored)
+    if passwords.needs_rehash(stored):
+        await passwords.hash_password(PASSWORD)
+
+
+async def run(login, stored, count, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await login(stored)
+            latencies.append(time.perf_counter() - started)
+
+    stop = asyncio.Event()
+    lag = asyncio.create_task(_measure_lag(stop))
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(count)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return elapsed, latencies, await lag
+
+
+def report(name, count, elapsed, latencies, lag):
+    latencies = sorted(latency * 1000 for latency in latencies)
+    p99 = latencies[min(len(latencies) - 1, int(round(0.99 * (len(latencies) - 1))))]
+    print(f"{name:<34} {count / elapsed:7.1f} входов/с  "
+          f"p50 {statistics.median(latencies):8.1f} мс  p99 {p99:8.1f} мс  "
+          f"макс. задержка event loop {lag * 1000:8.1f} мс")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Вход под нагрузкой: проверка пароля и rehash-on-login")
+    parser.add_argument("--logins", type=int, default=64, help="входов в каждом замере")
+    parser.add_argument("--concurrency", type=int, default=16, help="одновременных входов")
+    args = parser.parse_args()
+
+    current = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode("utf-8")
+    outdated_rounds = BCRYPT_ROUNDS - 1 if BCRYPT_ROUNDS > 4 else BCRYPT_ROUNDS + 1
+    outdated = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=outdated_rounds)).decode("utf-8")
+
+    print(f"bcrypt rounds={BCRYPT_ROUNDS}, потоков в пуле {PASSWORD_HASH_CONCURRENCY}, "
+          f"одновременных входов {args.concurrency}")
+    try:
+        scenarios = [
+            ("в event loop", login_inline, current),
+            ("пул app.passwords", login_pool, current),
+            (f"пул + rehash (cost {outdated_rounds})", login_pool, outdated),
+        ]
+        for name, login, stored in scenarios:
+            report(name, args.logins, *asyncio.run(run(login, stored, args.logins, args.concurrency)))
+    finally:
+        passwords.shutdown_executor()
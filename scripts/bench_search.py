@@ -0,0 +1,190 @@
+# scripts/bench_search.py
+#
+# Задержка поиска статей по мере роста архива: запрос /api/news/search (app.news.SEARCH_SQL)
+# против поиска подстроки ILIKE '%...%' по заголовку, тексту и тегам.
+# Корпус синтетический: словарь с распределением Ципфа, поэтому в нём есть и частые,
+# и редкие слова. Данные лежат во временных таблицах articles, tag, article_tag и
+# article_images — они перекрывают таблицы приложения только в этой сессии.
+# Запуск из корня репозитория:
+#   python -m scripts.bench_search --sizes 1000,10000,100000 --repeat 10
+
+import argparse
+import asyncio
+import bisect
+import datetime
+import itertools
+import random
+import statistics
+import time
+
+import asyncpg
+
+from app.config import db_params
+from app.news import SEARCH_SQL
+
+SYLLABLES = ["ка", "ло", "ми", "ре", "ту", "са", "ве", "но", "ди", "жу", "пы", "зо", "ха", "че", "шо", "бу"]
+VOCABULARY_SIZE = 20000
+ZIPF_EXPONENT = 1.1
+TAG_COUNT = 300
+
+# Ранги слов в словаре для запросов: от частого до встречающегося в единицах статей
+QUERY_RANKS = [10, 100, 1000, 10000]
+
+SETUP_SQL = [
+    """
+    CREATE TEMP TABLE articles (
+        id serial PRIMARY KEY,
+        title text NOT NULL,
+        content text NOT NULL,
+        publication_date timestamp NOT NULL,
+        is_published boolean NOT NULL,
+        search_vector tsvector
+    )
+    """,
+    "CREATE TEMP TABLE tag (id serial PRIMARY KEY, name text NOT NULL UNIQUE)",
+    "CREATE TEMP TABLE article_tag (article_id integer NOT NULL, tag_id integer NOT NULL)",
+    "CREATE TEMP TABLE article_images (id serial PRIMARY KEY, article_id integer NOT NULL, image_path text NOT NULL)",
+    # Индексы — как в app/schema.py
+    "CREATE INDEX ON article_tag (article_id)",
+    "CREATE INDEX ON article_tag (tag_id, article_id)",
+    "CREATE INDEX ON article_images (article_id, id)",
+    "CREATE INDEX ON articles USING GIN (search_vector)",
+]
+
+# То же выражение, что в триггере articles_search_vector_update (app/schema.py)
+SEARCH_VECTOR_SQL = """
+    UPDATE articles a SET search_vector =
+        setweight(to_tsvector('russian', COALESCE(a.title, '')), 'A') ||
+        setweight(to_tsvector('russian', COALESCE((
+            SELECT string_agg(t.name, ' ')
+            FROM article_tag at
+            JOIN tag t ON t.id = at.tag_id
+            WHERE at.article_id = a.id
+        ), '')), 'B') ||
+        setweight(to_tsvector('russian', COALESCE(a.content, '')), 'C')
+    WHERE a.search_vector IS NULL
+"""
+
+# Поиск без полнотекстового индекса: подстрока в заголовке, тексте или тегах, новые сверху
+ILIKE_SQL = """
+    SELECT a.id, a.title, a.publication_date,
+           (SELECT image_path FROM article_images ai WHERE ai.article_id = a.id ORDER BY ai.id LIMIT 1)
+    FROM articles a
+    WHERE a.is_published = TRUE
+      AND (a.title ILIKE $1 OR a.content ILIKE $1 OR EXISTS (
+          SELECT 1 FROM article_tag at JOIN tag t ON t.id = at.tag_id
+          WHERE at.article_id = a.id AND t.name ILIKE $1
+      ))
+    ORDER BY a.publication_date DESC, a.id DESC
+    LIMIT $2 OFFSET $3
+"""
+
+MATCHES_SQL = """
+    SELECT COUNT(*) FROM articles
+    WHERE is_published AND search_vector @@ websearch_to_tsquery('russian', $1)
+"""
+
+
+def make_vocabulary(size):
+    # Псевдослова из трёх-четырёх слогов; порядок задаёт ранг слова
+    words = ("".join(parts) for n in (3, 4) for parts in itertools.product(SYLLABLES, repeat=n))
+    return list(itertools.islice(words, size))
+
+
+class ZipfSampler:
+    def __init__(self, words, exponent, rng):
+        self.words = words
+        self.rng = rng
+        self.cumulative = list(itertools.accumulate(1 / rank ** exponent for rank in range(1, len(words) + 1)))
+
+    def sample(self, count):
+        total = self.cumulative[-1]
+        return [self.words[bisect.bisect_left(self.cumulative, self.rng.random() * total)] for _ in range(count)]
+
+
+def make_articles(first_id, count, sampler, rng):
+    start = datetime.datetime(2015, 1, 1)
+    articles, links, images = [], [], []
+    for article_id in range(first_id, first_id + count):
+        title = " ".join(sampler.sample(rng.randint(4, 8)))
+        content = " ".join(sampler.sample(rng.randint(80, 250)))
+        published_at = start + datetime.timedelta(minutes=rng.randint(0, 10 * 365 * 24 * 60))
+        articles.append((article_id, title, content, published_at, rng.random() < 0.9))
+        for tag_id in rng.sample(range(1, TAG_COUNT + 1), rng.randint(0, 3)):
+            links.append((article_id, tag_id))
+        if rng.random() < 0.7:
+            images.append((article_id, f"/static/images/articles/{article_id}/cover.jpg"))
+    return articles, links, images
+
+
+async def grow(conn, current, target, sampler, rng):
+    articles, links, images = make_articles(current + 1, target - current, sampler, rng)
+    await conn.copy_records_to_table(
+        "articles", records=articles,
+        columns=["id", "title", "content", "publication_date", "is_published"]
+    )
+    await conn.copy_records_to_table("article_tag", records=links, columns=["article_id", "tag_id"])
+    await conn.copy_records_to_table("article_images", records=images, columns=["article_id", "image_path"])
+    await conn.execute(SEARCH_VECTOR_SQL)
+    await conn.execute("ANALYZE articles")
+    await conn.execute("ANALYZE article_tag")
+    await conn.execute("ANALYZE article_images")
+
+
+async def timed(conn, sql, args, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await conn.fetch(sql, *args)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return statistics.median(latencies)
+
+
+async def main(sizes, repeat, limit, seed):
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(VOCABULARY_SIZE)
+    sampler = ZipfSampler(vocabulary, ZIPF_EXPONENT, rng)
+    terms = [vocabulary[rank - 1] for rank in QUERY_RANKS]
+
+    params = dict(db_params)
+    conn = await asyncpg.connect(database=params.pop("dbname"), **params)
+    try:
+        for statement in SETUP_SQL:
+            await conn.execute(statement)
+        # Запросы ниже должны попасть во временные таблицы, а не в таблицы приложения
+        schema = await conn.fetchval("SELECT relnamespace::regnamespace::text FROM pg_class WHERE oid = 'articles'::regclass")
+        if not schema.startswith("pg_temp"):
+            raise SystemExit(f"articles разрешается в схему {schema}, а не во временную таблицу")
+
+        # Теги — уникальные слова из частой части словаря
+        tag_names = rng.sample(vocabulary[:2000], TAG_COUNT)
+        await conn.copy_records_to_table(
+            "tag", records=list(enumerate(tag_names, 1)), columns=["id", "name"]
+        )
+
+        print(f"Медиана из {repeat} запусков, LIMIT {limit}; слова запросов — ранги {QUERY_RANKS} по частоте")
+        print(f"{'статей':>8} {'ранг':>6} {'совпадений':>11} {'FTS, мс':>9} {'ILIKE, мс':>10}")
+        current = 0
+        for size in sorted(sizes):
+            started = time.perf_counter()
+            await grow(conn, current, size, sampler, rng)
+            current = size
+            print(f"-- {size} статей, подготовка {time.perf_counter() - started:.1f} с")
+            for rank, term in zip(QUERY_RANKS, terms):
+                matches = await conn.fetchval(MATCHES_SQL, term)
+                fts = await timed(conn, SEARCH_SQL, (term, limit, 0), repeat)
+                ilike = await timed(conn, ILIKE_SQL, (f"%{term}%", limit, 0), repeat)
+                print(f"{size:>8} {rank:>6} {matches:>11} {fts:9.2f} {ilike:10.2f}")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Поиск статей: полнотекстовый индекс против ILIKE по мере роста архива")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="размеры архива через запятую")
+    parser.add_argument("--repeat", type=int, default=10, help="повторов каждого запроса")
+    parser.add_argument("--limit", type=int, default=10, help="размер страницы, как limit в /api/news/search")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    asyncio.run(main([int(size) for size in args.sizes.split(",")], args.repeat, args.limit, args.seed))
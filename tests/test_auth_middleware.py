@@ -0,0 +1,149 @@
+import asyncio
+import time
+
+import pytest
+from jose import jwt
+
+from app.auth_middleware import AuthMiddleware, is_public_path
+from app.config import SECRET_KEY, ALGORITHM
+
+
+PUBLIC_PATHS = [
+    "/api/login",
+    "/api/register",
+    "/api/news",
+    "/api/news/search",
+    "/api/news/tags",
+    "/api/newsPage",
+    "/api/newsPage/42",
+    "/api/resorts",
+    "/api/resort-catalog",
+    "/api/blogger-reviews",
+    "/api/blogger-reviews/images",
+    "/api/blogger-reviews/7/images",
+    "/api/resorts-table",
+    "/api/resort-features/3",
+    "/api/resorts/selector",
+    "/api/resorts/selector/facets",
+    "/api/resorts/15",
+    "/api/resorts/15/snow-forecast",
+    "/api/comments/9",
+    "/api/resorts/15/hotels",
+    "/api/resorts/preview-reviews",
+    "/api/resorts/15/reviews",
+    "/api/resort-images/15",
+    "/api/hotels-images/15/2",
+    "/api/article_images/1",
+    "/docs",
+    "/openapi.json",
+    "/static/images/resorts/1/img1.jpg",
+]
+
+PRIVATE_PATHS = [
+    # Публичный маршрут с лишним суффиксом
+    "/api/login/extra",
+    "/api/news/unpublished",
+    "/api/newsPage/42/vote",
+    "/api/resorts/15/submit-review",
+    "/api/resorts/abc",
+    "/api/resorts/preview-reviews/extra",
+    "/api/blogger-reviews/moderation",
+    "/api/blogger-reviews/7/approve",
+    "/api/profile",
+    "/api/x/api/login",
+    # Административные маршруты
+    "/api/admin/users",
+    "/api/admin/users/5/block",
+    "/api/admin/users/5/unblock",
+    "/api/admin/comments",
+    "/api/admin/comments/3",
+    "/api/admin/comments/3/approve",
+    "/api/blogger-requests",
+    "/api/blogger-requests/4/approve",
+    "/api/news/publish/1",
+    "/api/news/delete/1",
+    "/api/reviews/pending",
+    "/api/reviews/8/approve",
+]
+
+
+@pytest.mark.parametrize("path", PUBLIC_PATHS)
+def test_public_paths(path):
+    assert is_public_path(path)
+
+
+@pytest.mark.parametrize("path", PRIVATE_PATHS)
+def test_private_paths(path):
+    assert not is_public_path(path)
+
+
+def _call(path, headers=()):
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append(scope)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers],
+    }
+    asyncio.run(AuthMiddleware(app)(scope, receive, send))
+    return sent[0]["status"], calls
+
+
+def test_private_path_without_token_is_rejected():
+    status, calls = _call("/api/profile")
+    assert status == 401
+    assert calls == []
+
+
+def test_private_path_with_malformed_header_is_rejected():
+    status, calls = _call("/api/admin/users", [("Authorization", "Token abc")])
+    assert status == 401
+    assert calls == []
+
+
+def test_private_path_with_invalid_token_is_rejected():
+    status, calls = _call("/api/profile", [("Authorization", "Bearer not-a-jwt")])
+    assert status == 401
+    assert calls == []
+
+
+def test_public_path_passes_through_without_token():
+    status, calls = _call("/api/resorts/15")
+    assert status == 200
+    assert len(calls) == 1
+
+
+def test_static_passes_through_without_token():
+    status, calls = _call("/static/images/resorts/1/img1.jpg")
+    assert status == 200
+    assert len(calls) == 1
+
+
+def _token(sub):
+    return jwt.encode({"sub": sub, "exp": int(time.time()) + 60}, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def test_private_path_with_non_numeric_sub_is_rejected():
+    status, calls = _call("/api/profile", [("Authorization", f"Bearer {_token('admin')}")])
+    assert status == 401
+    assert calls == []
+
+
+def test_private_path_with_valid_token_sets_user():
+    status, calls = _call("/api/profile", [("Authorization", f"Bearer {_token('5')}")])
+    assert status == 200
+    assert calls[0]["state"]["user_id"] == "5"
@@ -0,0 +1,55 @@
+import base64
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from fastapi import HTTPException
+
+from app.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, set_next_cursor
+
+
+class _Response:
+    def __init__(self):
+        self.headers = {}
+
+
+def test_cursor_round_trip_keeps_timestamp_precision():
+    published = datetime(2026, 1, 10, 8, 30, 15, 123456)
+    value, article_id = decode_cursor(encode_cursor(published, 42), 2)
+    assert datetime.fromisoformat(value) == published
+    assert int(article_id) == 42
+
+
+def test_cursor_round_trip_numeric_key():
+    value, review_id = decode_cursor(encode_cursor(Decimal("4.3"), 7), 2)
+    assert Decimal(value) == Decimal("4.3")
+    assert review_id == "7"
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(datetime(2026, 1, 10, 23, 59, 59, 999999), 2 ** 31 - 1)
+    assert all(char.isalnum() or char in "-_=" for char in cursor)
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"\xff\xfe").decode("ascii"),   # не UTF-8
+    encode_cursor("only-one-value"),                           # не то число значений
+    encode_cursor("a", "b", "c"),
+])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, 2)
+    assert error.value.status_code == 400
+
+
+def test_next_cursor_header():
+    response = _Response()
+    set_next_cursor(response, encode_cursor(1, 2))
+    assert decode_cursor(response.headers[NEXT_CURSOR_HEADER], 2) == ["1", "2"]
+
+
+def test_last_page_has_no_next_cursor():
+    response = _Response()
+    set_next_cursor(response, None)
+    assert NEXT_CURSOR_HEADER not in response.headers
@@ -0,0 +1,160 @@
+from datetime import date
+
+import pytest
+
+from app.resort_index import ResortIndex
+
+
+def _row(resort_id, name, price_day=None, max_height=None, trail_length=None, average_rating=None,
+         num_reviews=0, green=0, blue=0, red=0, black=0):
+    return {
+        "id": resort_id,
+        "name": name,
+        "price_day": price_day,
+        "max_height": max_height,
+        "trail_length": trail_length,
+        "average_rating": average_rating,
+        "num_reviews": num_reviews,
+        "trail_green": green,
+        "trail_blue": blue,
+        "trail_red": red,
+        "trail_black": black,
+    }
+
+
+ROWS = [
+    _row(1, "Альпы", price_day=60, max_height=3200, trail_length=150, average_rating=4.5, num_reviews=10, blue=20, red=5),
+    _row(2, "Буковель", price_day=25, max_height=1500, trail_length=70, average_rating=None, num_reviews=0, green=10),
+    _row(3, "Вершина", price_day=None, max_height=2500, trail_length=None, average_rating=3.0, num_reviews=4, black=3),
+    _row(4, "Гудаури", price_day=35, max_height=3250, trail_length=70, average_rating=4.0, num_reviews=7, red=12, black=4),
+]
+
+FLAGS = {
+    1: {"snow_last_3_days": True, "snow_expected": False, "visa": True},
+    2: {"snow_last_3_days": False, "snow_expected": True, "visa": False},
+    4: {"snow_last_3_days": True, "snow_expected": True, "visa": False},
+}
+
+FEATURES = {
+    1: {"night_skiing": True, "glacier_available": True},
+    4: {"night_skiing": True, "glacier_available": False},
+}
+
+TODAY = date(2026, 1, 10)
+
+SNOW_FORECAST = {
+    # Прогноз начался два дня назад: первые два значения уже в прошлом
+    1: {"start": date(2026, 1, 8), "snowfall": [50.0, 50.0, 1.0, 2.0, None, 4.0]},
+    2: {"start": date(2026, 1, 10), "snowfall": [10.0, 0.0, 0.0]},
+    # Прогноз из будущего (часовой пояс сервера впереди): окно начинается с первого дня
+    4: {"start": date(2026, 1, 11), "snowfall": [3.0, 3.0, 3.0, 3.0]},
+}
+
+
+@pytest.fixture
+def index():
+    return ResortIndex(ROWS, FLAGS, FEATURES, SNOW_FORECAST)
+
+
+def _ids(rows):
+    return [row["id"] for row in rows]
+
+
+def _mask_ids(index, mask):
+    return [row["id"] for pos, row in enumerate(index.rows) if mask >> pos & 1]
+
+
+def test_facets_are_intersected(index):
+    assert _mask_ids(index, index.match([("snow_last_3_days", "true")])) == [1, 4]
+    assert _mask_ids(index, index.match([("snow_last_3_days", "true"), ("visa", "no")])) == [4]
+    assert _mask_ids(index, index.match([("slopes", "Чёрная")])) == [3, 4]
+    assert _mask_ids(index, index.match([("features", "night_skiing"), ("features", "glacier_available")])) == [1]
+
+
+def test_unknown_facet_matches_nothing(index):
+    assert index.match([("slopes", "Фиолетовая")]) == 0
+    assert index.has_facet("features", "heliski_available")
+    assert not index.has_facet("slopes", "Фиолетовая")
+
+
+def test_range_bounds_are_inclusive(index):
+    assert _mask_ids(index, index.match(ranges={"price_day": (25, 35)})) == [2, 4]
+    assert _mask_ids(index, index.match(ranges={"trail_length": (70, 70)})) == [2, 4]
+
+
+def test_open_range_bounds(index):
+    assert _mask_ids(index, index.match(ranges={"max_height": (3000, None)})) == [1, 4]
+    assert _mask_ids(index, index.match(ranges={"max_height": (None, 2500)})) == [2, 3]
+
+
+def test_range_excludes_missing_values(index):
+    # У курорта 3 нет цены — в любой диапазон по цене он не попадает
+    assert _mask_ids(index, index.match(ranges={"price_day": (None, None)})) == [1, 2, 4]
+
+
+def test_empty_and_inverted_ranges(index):
+    assert index.match(ranges={"price_day": (100, 200)}) == 0
+    assert index.match(ranges={"price_day": (50, 30)}) == 0
+    assert index.match(ranges={"price_day": (26, 34)}) == 0
+
+
+def test_range_mask_matches_brute_force(index):
+    values = [None, 0, 25, 30, 35, 60, 70]
+    for low in values:
+        for high in values:
+            expected = [
+                row["id"] for row in ROWS
+                if row["price_day"] is not None
+                and (low is None or row["price_day"] >= low)
+                and (high is None or row["price_day"] <= high)
+            ]
+            assert _mask_ids(index, index.match(ranges={"price_day": (low, high)})) == expected
+
+
+def test_facets_and_ranges_combine(index):
+    mask = index.match([("snow_expected", "true")], {"max_height": (2000, None)})
+    assert _mask_ids(index, mask) == [4]
+
+
+def test_sort_puts_missing_values_last_in_both_directions(index):
+    assert _ids(index.rows_for(index.all, sort="price_day")) == [2, 4, 1, 3]
+    assert _ids(index.rows_for(index.all, sort="price_day", descending=True)) == [1, 4, 2, 3]
+    assert _ids(index.rows_for(index.all, sort="average_rating")) == [3, 4, 1, 2]
+    assert _ids(index.rows_for(index.all, sort="average_rating", descending=True)) == [1, 4, 3, 2]
+
+
+def test_sort_respects_mask(index):
+    mask = index.match([("snow_last_3_days", "true")])
+    assert _ids(index.rows_for(mask, sort="max_height", descending=True)) == [4, 1]
+    assert _ids(index.rows_for(mask)) == [1, 4]
+
+
+def test_snowfall_window_starts_at_today(index):
+    # Курорт 1: сегодня — третий день ряда, пропуск (None) считается нулём
+    assert index.snowfall_total(0, 3, TODAY) == 3.0
+    assert index.snowfall_total(1, 3, TODAY) == 10.0
+    assert index.snowfall_total(2, 3, TODAY) is None
+    # Прогноз начинается завтра — окно берётся с его первого дня
+    assert index.snowfall_total(3, 2, TODAY) == 6.0
+
+
+def test_snowfall_window_is_clipped_to_forecast(index):
+    assert index.snowfall_total(0, 16, TODAY) == 7.0
+    # Ряд курорта 2 закончился — данных на эти дни нет
+    assert index.snowfall_total(1, 3, date(2026, 1, 20)) is None
+
+
+def test_sort_by_snowfall(index):
+    rows = index.rows_for(index.all, sort="snowfall", descending=True, snow_days=3, today=TODAY)
+    assert _ids(rows) == [2, 4, 1, 3]
+    assert [row["expected_snowfall"] for row in rows] == [10.0, 9.0, 3.0, None]
+
+    rows = index.rows_for(index.all, sort="snowfall", snow_days=3, today=TODAY)
+    assert _ids(rows) == [1, 4, 2, 3]
+
+
+def test_facet_counts(index):
+    counts = index.facet_counts(index.match([("visa", "no")]))
+    assert counts["snow_expected"] == {"true": 2, "false": 0}
+    assert counts["slopes"]["Чёрная"] == 1
+    assert index.count(index.all) == 4
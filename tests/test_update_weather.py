@@ -0,0 +1,108 @@
+import pytest
+
+from app import update_weather_open_meteo as weather
+from app.update_weather_open_meteo import (
+    fetch_forecasts, group_by_grid_cell, make_session, needs_refresh, refresh_weather, start_stub_server
+)
+
+
+@pytest.fixture
+def stub():
+    server = start_stub_server()
+    yield server
+    server.shutdown()
+
+
+def _url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/v1/forecast"
+
+
+def test_group_by_grid_cell_merges_neighbours():
+    resorts = [
+        (1, 45.30, 6.58),
+        (2, 45.31, 6.59),   # та же ячейка 0.1°, что и у курорта 1
+        (3, 45.30, 6.58),   # совпадающие координаты
+        (4, 46.02, 7.75),
+    ]
+    cells = group_by_grid_cell(resorts, step=0.1)
+    assert len(cells) == 2
+    assert cells[0] == ((45.30, 6.58), [1, 2, 3])
+    assert cells[1] == ((46.02, 7.75), [4])
+
+
+def test_group_by_grid_cell_keeps_distant_resorts_apart():
+    cells = group_by_grid_cell([(1, 45.30, 6.58), (2, 45.50, 6.58)], step=0.1)
+    assert [ids for _, ids in cells] == [[1], [2]]
+
+
+def test_fetch_forecasts_single_point(stub):
+    forecasts = fetch_forecasts(make_session(), _url(stub), [(45.3, 6.58)])
+    assert len(forecasts) == 1
+    assert forecasts[0]["latitude"] == 45.3
+    assert len(forecasts[0]["daily"]["snowfall"]) == len(forecasts[0]["daily"]["time"])
+    assert stub.request_count == 1
+
+
+def test_fetch_forecasts_batch_keeps_order(stub):
+    points = [(45.3, 6.58), (46.02, 7.75), (47.1, 10.9)]
+    forecasts = fetch_forecasts(make_session(), _url(stub), points)
+    assert [(f["latitude"], f["longitude"]) for f in forecasts] == points
+    assert stub.request_count == 1
+
+
+def test_fetch_forecasts_rejects_short_response():
+    class Response:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return [{"daily": {}}]
+
+    class Session:
+        def get(self, url, params, timeout):
+            return Response()
+
+    with pytest.raises(ValueError):
+        fetch_forecasts(Session(), "http://stub", [(1.0, 1.0), (2.0, 2.0)])
+
+
+@pytest.mark.parametrize("age, snowfall_start, expected", [
+    (None, None, True),                  # погоды ещё нет
+    (60, None, True),                    # заглушка от создания курорта: свежая, но без ряда
+    (60, "2026-01-01", False),           # свежий прогноз — пропускаем
+    (3 * 3600, "2026-01-01", True),      # окно свежести истекло
+])
+def test_needs_refresh(age, snowfall_start, expected):
+    assert needs_refresh(age, snowfall_start, freshness=3 * 3600) is expected
+
+
+def test_refresh_weather_batches_requests(stub, monkeypatch):
+    resorts = [
+        (1, 45.30, 6.58), (2, 45.31, 6.59),   # одна ячейка
+        (3, 46.02, 7.75),
+        (4, 47.10, 10.90),
+        (5, 44.00, 7.00),
+    ]
+    saved = []
+    monkeypatch.setattr(weather, "load_resort_coordinates", lambda freshness: (resorts, 7))
+    monkeypatch.setattr(weather, "save_weather", saved.extend)
+
+    stats = refresh_weather(base_url=_url(stub), concurrency=2, batch_size=2)
+
+    # 4 ячейки по 2 в запросе — 2 HTTP-запроса на 5 курортов
+    assert stub.request_count == 2
+    assert stats == {"updated": 5, "failed": 0, "skipped": 2, "requests": 2}
+    assert sorted(row[0] for row in saved) == [1, 2, 3, 4, 5]
+    # Курорты одной ячейки получают один и тот же прогноз
+    by_id = {row[0]: row for row in saved}
+    assert by_id[1][1:] == by_id[2][1:]
+
+
+def test_refresh_weather_without_stale_resorts_makes_no_requests(stub, monkeypatch):
+    monkeypatch.setattr(weather, "load_resort_coordinates", lambda freshness: ([], 3))
+    monkeypatch.setattr(weather, "save_weather", lambda rows: None)
+
+    stats = refresh_weather(base_url=_url(stub))
+
+    assert stub.request_count == 0
+    assert stats == {"updated": 0, "failed": 0, "skipped": 3, "requests": 0}